@@ -1,20 +1,19 @@
 import streamlit as st
 import pandas as pd
 import openai
-import matplotlib.pyplot as plt
 import os
 from dotenv import load_dotenv
-import matplotlib.font_manager as fm
+from charts import admission_score_bars, aptitude_radar
+from datasets import get_admission_table, get_department_index, get_multi_year_tables, get_score_index, get_scoring_engine
+from facets import SCHOOL_TYPES, facet_mask
+from llm_client import UNAVAILABLE_MESSAGE, cached_response, last_error, pending, stream_chat_completion
+from prompts import admission_info_prompt, aptitude_prompt, shortfall_prompt
+from scoring import SUBJECTS, ScoringEngine
+from summaries import department_summary, field_summary
 
 # 載入環境變數
 load_dotenv()
 
-# 字型設定（避免重複導入 plt）
-fm.fontManager.addfont('TaipeiSansTCBeta-Regular.ttf')
-plt.rc('font', family='Taipei Sans TC Beta')
-plt.rcParams['font.sans-serif'] = ['Microsoft JhengHei', 'Arial']
-plt.rcParams['axes.unicode_minus'] = False
-
 # 設定 API 金鑰
 api_key = os.getenv("OPENAI_API_KEY")
 if not api_key:
@@ -22,6 +21,34 @@ if not api_key:
     st.stop()
 openai.api_key = api_key
 
+# AI 回覆：串流顯示；超過時間預算時先顯示備用內容，完整回覆在背景產生後自動補上
+def show_ai_response(prompt, fallback=None):
+    error = st.session_state.setdefault("ai_failures", {}).get(prompt)
+    if error is not None:
+        # 背景請求已失敗：顯示備用內容，不再重試也不再輪詢（重新按下計算/分析才會再試）
+        st.write(fallback or UNAVAILABLE_MESSAGE)
+        st.caption(f"完整的 AI 回覆產生失敗：{error}")
+        return
+    shown = st.write_stream(stream_chat_completion(prompt, fallback=fallback))
+    live = cached_response(prompt)
+    if live is not None and live != shown:
+        st.markdown("#### 完整 AI 回覆")
+        st.write(live)
+    elif live is None and pending(prompt):
+        wait_for_ai_response(prompt)
+
+
+@st.fragment(run_every=3)
+def wait_for_ai_response(prompt):
+    # 背景請求結束（成功或失敗）後重跑整頁一次：成功時由快取直接顯示完整回覆，
+    # 失敗時記下錯誤改顯示備用內容；重跑後不再呼叫這個 fragment，每 3 秒的輪詢隨之停止
+    if pending(prompt):
+        st.caption("完整的 AI 回覆產生中…")
+        return
+    if cached_response(prompt) is None:
+        st.session_state.ai_failures[prompt] = last_error(prompt) or UNAVAILABLE_MESSAGE
+    st.rerun(scope="app")
+
 # 自訂 CSS 樣式
 st.markdown("""
     <style>
@@ -39,45 +66,72 @@ st.title("🎓 新生學網站")
 # 創建分頁
 tab1, tab2 = st.tabs(["📚 成績分發系統", "🧠 性向測驗"])
 
-# 在成績分發系統分頁中
-with tab1:
+# 成績分發系統分頁（fragment：年度、學校類型、學校與科系等選項只重跑這個分頁）
+@st.fragment
+def admission_tab():
     st.markdown("**探索 112 與 113 學年錄取資訊，輸入成績即刻評估！**", unsafe_allow_html=True)
     st.markdown("---")
     
-    # 讀取資料並轉換數值型態
-    df_113 = pd.read_excel("11309a (1).xlsx", sheet_name="Sheet1")
-    df_112 = pd.read_excel("11209.xlsx", sheet_name="工作表1")
-
-    df_113['錄取總分數'] = pd.to_numeric(df_113['錄取總分數'], errors='coerce')
-    df_112['錄取總分數'] = pd.to_numeric(df_112['錄取總分數'], errors='coerce')
+    # 讀取資料（已轉換數值型態，各 session 共用）
+    df_113 = get_admission_table("113")
+    df_112 = get_admission_table("112")
+    department_indexes = {"113": get_department_index("113"), "112": get_department_index("112")}
 
     # 年度選擇
     with st.container():
         st.subheader("步驟 1：選擇查詢年度")
         year_option = st.radio("選擇年度：", ["113", "112", "全部"], horizontal=True, key="year_radio")
 
-    # 合併資料
+    # 合併資料（兩年度上下相接、含「年度」欄的表在載入時已建立）
     if year_option == "全部":
-        df_113["年度"] = "113"
-        df_112["年度"] = "112"
-        df = pd.concat([df_113, df_112], ignore_index=True)
+        multi_year = get_multi_year_tables()
+        df = multi_year.stacked
+        # 各年度資料在 df 中的起始列位置
+        offsets = multi_year.offsets
     else:
         df = df_113 if year_option == "113" else df_112
+        offsets = {year_option: 0}
+
+    def similar_departments(total, k=3, radius=50):
+        # 錄取總分數與 total 相差 radius 分以內、最接近的 k 個校系，依差距由近到遠排序
+        candidates = []
+        for year, offset in offsets.items():
+            score_index = get_score_index(year, "錄取總分數")
+            for pos in score_index.nearest(total, k, radius):
+                candidates.append((abs(score_index.values[pos] - total), offset + pos))
+        return df.iloc[[pos for _, pos in sorted(candidates)[:k]]]
+
+    def show_improvements(year, scores, school, department, k=5):
+        # 一次算出該年度所有校系還差多少分、補哪一科最省力
+        improvements = get_scoring_engine(year).improvements(scores)
+        year_df = df_113 if year == "113" else df_112
+        pos = department_indexes[year].get(school, department)
+        if pos >= 0:
+            subject = improvements.subject[pos]
+            if subject >= 0:
+                st.info(f"💡 最省力的方式：{SUBJECTS[subject]}提高 {improvements.subject_points[pos]:.2f} 分即可達到錄取總分。")
+            elif pd.notna(improvements.points_needed[pos]):
+                st.info(f"💡 只補一科無法達到，各科合計最少需要提高 {improvements.points_needed[pos]:.2f} 分（先補加權較高的科目）。")
+            else:
+                st.info("💡 即使各科都考到滿分，也無法達到這個校系的錄取總分。")
+        closest = improvements.closest(k)
+        if len(closest):
+            st.write(f"### 建議：補分最少即可達到的學校與科系（{year} 年度）")
+            for p in closest:
+                row = year_df.iloc[p]
+                subject = improvements.subject[p]
+                single = f"；只補{SUBJECTS[subject]}需 {improvements.subject_points[p]:.2f} 分" if subject >= 0 else ""
+                st.write(f"- {row['學校名稱']} - {row['系科組學程名稱']}（最少需提高 {improvements.points_needed[p]:.2f} 分{single}）")
 
     # 學校與科系選擇
     with st.container():
         st.subheader("步驟 2：選擇學校與科系")
         
         # 添加學校類型選擇
-        school_type = st.radio("學校類型：", ["全部", "公立", "私立"], horizontal=True, key="school_type")
+        school_type = st.radio("學校類型：", SCHOOL_TYPES, horizontal=True, key="school_type")
         
-        # 根據學校類型篩選學校
-        if school_type == "公立":
-            filtered_schools = [school for school in df["學校名稱"].unique() if school.startswith("國立")]
-        elif school_type == "私立":
-            filtered_schools = [school for school in df["學校名稱"].unique() if not school.startswith("國立")]
-        else:  # 全部
-            filtered_schools = df["學校名稱"].unique()
+        # 根據學校類型篩選學校（以載入時建立的「公立」布林欄位篩選）
+        filtered_schools = df.loc[facet_mask(df, school_type), "學校名稱"].unique()
         
         col1, col2 = st.columns(2)
         with col1:
@@ -88,7 +142,13 @@ with tab1:
 
     # 顯示加權資料與錄取資訊
     if department_name:
-        selected_rows = df[(df["學校名稱"] == school_name) & (df["系科組學程名稱"] == department_name)]
+        # 以各年度的校系索引定位資料列
+        selected_positions = []
+        for year, offset in offsets.items():
+            pos = department_indexes[year].get(school_name, department_name)
+            if pos >= 0:
+                selected_positions.append(offset + pos)
+        selected_rows = df.iloc[selected_positions]
         if selected_rows.empty:
             st.warning("⚠️ 查無資料")
         else:
@@ -117,23 +177,12 @@ with tab1:
                         "112": [row_112[col] for col in ["國文加權", " 英文加權", " 數學加權", " 專業(一)加權", " 專業(二)加權", "錄取總分數"]],
                         "差異": [compare_val(row_113[col], row_112[col]) for col in ["國文加權", " 英文加權", " 數學加權", " 專業(一)加權", " 專業(二)加權", "錄取總分數"]]
                     }
-                    st.dataframe(pd.DataFrame(table_data), use_container_width=True)
+                    st.dataframe(pd.DataFrame(table_data), width="stretch")
 
                     # 美化柱狀圖
                     st.markdown("**錄取總分柱狀圖**")
-                    fig, ax = plt.subplots(figsize=(6, 4))
-                    years = ['112', '113']
-                    scores = [float(row_112['錄取總分數']), float(row_113['錄取總分數'])]
-                    bars = ax.bar(years, scores, color=['#4CAF50', '#2196F3'], edgecolor='black', linewidth=1)
-                    ax.set_xlabel('學年', fontsize=12)
-                    ax.set_ylabel('錄取總分', fontsize=12)
-                    ax.set_title(f'{school_name} {department_name}\n錄取總分比較', fontsize=14, pad=10)
-                    ax.set_ylim(0, max(scores) * 1.15)
-                    ax.grid(True, linestyle='--', alpha=0.7)
-                    for bar in bars:
-                        yval = bar.get_height()
-                        ax.text(bar.get_x() + bar.get_width()/2, yval + 1, f'{yval:.2f}', ha='center', va='bottom', fontsize=10)
-                    st.pyplot(fig)
+                    st.image(admission_score_bars(school_name, department_name, row_112['錄取總分數'], row_113['錄取總分數']),
+                             width="stretch")
 
             # 輸入成績區塊
             with st.container():
@@ -148,12 +197,23 @@ with tab1:
                     special_one_score = st.number_input("專業(一)成績", min_value=0, max_value=100, step=1, value=0, key="special1")
                     special_two_score = st.number_input("專業(二)成績", min_value=0, max_value=100, step=1, value=0, key="special2")
 
+                user_scores = [chinese_score, english_score, math_score, special_one_score, special_two_score]
+                calc_inputs = (year_option, school_name, department_name, tuple(user_scores))
                 if st.button("計算成績", key="calc_button"):
+                    st.session_state.calc_inputs = calc_inputs
+                    st.session_state.ai_failures = {}
+                # 結果保留到輸入改變為止（AI 回覆在背景完成時會重跑整頁）
+                if st.session_state.get("calc_inputs") == calc_inputs:
+                    # 一次算出所選校系（各年度）的加權總分、加權總和與加權平均
+                    selected_scores = ScoringEngine(selected_rows).score(user_scores)
+
                     # 如果選擇了"全部"，則需要分別計算 113 和 112 的結果
                     if year_option == "全部" and len(selected_rows) == 2:
                         # 獲取 113 和 112 的數據
-                        row_113 = selected_rows[selected_rows["年度"] == "113"].iloc[0]
-                        row_112 = selected_rows[selected_rows["年度"] == "112"].iloc[0]
+                        pos_113 = list(selected_rows["年度"]).index("113")
+                        pos_112 = list(selected_rows["年度"]).index("112")
+                        row_113 = selected_rows.iloc[pos_113]
+                        row_112 = selected_rows.iloc[pos_112]
                         
                         # 計算 113 年度的加權分數
                         chinese_weight_113 = row_113['國文加權']
@@ -163,13 +223,9 @@ with tab1:
                         special_two_weight_113 = row_113[' 專業(二)加權']
                         admission_score_113 = row_113['錄取總分數']
                         
-                        weighted_total_113 = (chinese_score * chinese_weight_113 +
-                                              english_score * english_weight_113 +
-                                              math_score * math_weight_113 +
-                                              special_one_score * special_one_weight_113 +
-                                              special_two_score * special_two_weight_113)
-                        total_weight_113 = chinese_weight_113 + english_weight_113 + math_weight_113 + special_one_weight_113 + special_two_weight_113
-                        weighted_average_113 = weighted_total_113 / total_weight_113 if total_weight_113 > 0 else 0
+                        weighted_total_113 = selected_scores.totals[pos_113]
+                        total_weight_113 = selected_scores.weight_sums[pos_113]
+                        weighted_average_113 = selected_scores.weighted_averages[pos_113] if total_weight_113 > 0 else 0
                         
                         # 計算 112 年度的加權分數
                         chinese_weight_112 = row_112['國文加權']
@@ -179,13 +235,9 @@ with tab1:
                         special_two_weight_112 = row_112[' 專業(二)加權']
                         admission_score_112 = row_112['錄取總分數']
                         
-                        weighted_total_112 = (chinese_score * chinese_weight_112 +
-                                              english_score * english_weight_112 +
-                                              math_score * math_weight_112 +
-                                              special_one_score * special_one_weight_112 +
-                                              special_two_score * special_two_weight_112)
-                        total_weight_112 = chinese_weight_112 + english_weight_112 + math_weight_112 + special_one_weight_112 + special_two_weight_112
-                        weighted_average_112 = weighted_total_112 / total_weight_112 if total_weight_112 > 0 else 0
+                        weighted_total_112 = selected_scores.totals[pos_112]
+                        total_weight_112 = selected_scores.weight_sums[pos_112]
+                        weighted_average_112 = selected_scores.weighted_averages[pos_112] if total_weight_112 > 0 else 0
                         
                         # 計算差異
                         def compare_val(a, b):
@@ -296,34 +348,25 @@ with tab1:
                         # 處理錄取結果
                         if weighted_total_113 >= admission_score_113:
                             st.success(f"🎉 恭喜！您的加權總分 ({weighted_total_113:.2f}) 達到或超過 113 年度錄取總分 ({admission_score_113:.2f})！")
-                            prompt = f"使用者錄取了 {school_name} 的 {department_name}，請提供該學校與科系的相關資訊。"
-                            response = openai.ChatCompletion.create(
-                                model="gpt-3.5-turbo",
-                                messages=[{"role": "user", "content": prompt}],
-                                max_tokens=500
-                            )
+                            prompt = admission_info_prompt(school_name, department_name)
                             st.write("### 錄取學校與科系資訊")
-                            st.write(response.choices[0].message["content"])
+                            show_ai_response(prompt, fallback=department_summary(row_113))
                         else:
                             st.warning(f"⚠️ 您的加權總分 ({weighted_total_113:.2f}) 低於 113 年度錄取總分 ({admission_score_113:.2f})，差 {admission_score_113 - weighted_total_113:.2f} 分。")
-                            similar_df = df[(df["錄取總分數"] <= weighted_total_113 + 50) & (df["錄取總分數"] >= weighted_total_113 - 50)].head(3)
+                            show_improvements("113", user_scores, school_name, department_name)
+                            similar_df = similar_departments(weighted_total_113)
                             if not similar_df.empty:
                                 st.write("### 建議：分數相近的學校與科系")
                                 for index, row in similar_df.iterrows():
                                     st.write(f"- {row['學校名稱']} - {row['系科組學程名稱']}（錄取總分：{row['錄取總分數']:.2f} 分）")
                             else:
                                 st.write("目前資料中沒有分數相近的學校與科系可推薦。")
-                            prompt = f"使用者的加權總分為 {weighted_total_113:.2f}，未達到 {school_name} 的 {department_name} 錄取總分 {admission_score_113:.2f}，請提供建議或鼓勵的話。"
-                            response = openai.ChatCompletion.create(
-                                model="gpt-3.5-turbo",
-                                messages=[{"role": "user", "content": prompt}],
-                                max_tokens=500
-                            )
+                            prompt = shortfall_prompt(weighted_total_113, school_name, department_name, admission_score_113)
                             st.write("### AI 建議")
-                            st.write(response.choices[0].message["content"])
+                            show_ai_response(prompt, fallback=department_summary(row_113))
                     else:
                         # 原有的單一年度計算邏輯
-                        for idx, row in selected_rows.iterrows():
+                        for pos, (idx, row) in enumerate(selected_rows.iterrows()):
                             chinese_weight = row['國文加權']
                             english_weight = row[' 英文加權']
                             math_weight = row[' 數學加權']
@@ -332,13 +375,9 @@ with tab1:
                             admission_score = row['錄取總分數']
                             year = row['年度'] if '年度' in row else year_option
 
-                            weighted_total = (chinese_score * chinese_weight +
-                                              english_score * english_weight +
-                                              math_score * math_weight +
-                                              special_one_score * special_one_weight +
-                                              special_two_score * special_two_weight)
-                            total_weight = chinese_weight + english_weight + math_weight + special_one_weight + special_two_weight
-                            weighted_average = weighted_total / total_weight if total_weight > 0 else 0
+                            weighted_total = selected_scores.totals[pos]
+                            total_weight = selected_scores.weight_sums[pos]
+                            weighted_average = selected_scores.weighted_averages[pos] if total_weight > 0 else 0
 
                             # 使用表格顯示年度結果
                             st.markdown(f"### {year} 年度結果")
@@ -393,34 +432,26 @@ with tab1:
 
                             if weighted_total >= admission_score:
                                 st.success(f"🎉 恭喜！您的加權總分 ({weighted_total:.2f}) 達到或超過錄取總分 ({admission_score:.2f})！")
-                                prompt = f"使用者錄取了 {school_name} 的 {department_name}，請提供該學校與科系的相關資訊。"
-                                response = openai.ChatCompletion.create(
-                                    model="gpt-3.5-turbo",
-                                    messages=[{"role": "user", "content": prompt}],
-                                    max_tokens=500
-                                )
+                                prompt = admission_info_prompt(school_name, department_name)
                                 st.write("### 錄取學校與科系資訊")
-                                st.write(response.choices[0].message["content"])
+                                show_ai_response(prompt, fallback=department_summary(selected_rows.iloc[pos]))
                             else:
                                 st.warning(f"⚠️ 您的加權總分 ({weighted_total:.2f}) 低於錄取總分 ({admission_score:.2f})，差 {admission_score - weighted_total:.2f} 分。")
-                                similar_df = df[(df["錄取總分數"] <= weighted_total + 50) & (df["錄取總分數"] >= weighted_total - 50)].head(3)
+                                show_improvements(year, user_scores, school_name, department_name)
+                                similar_df = similar_departments(weighted_total)
                                 if not similar_df.empty:
                                     st.write("### 建議：分數相近的學校與科系")
                                     for index, row in similar_df.iterrows():
                                         st.write(f"- {row['學校名稱']} - {row['系科組學程名稱']}（錄取總分：{row['錄取總分數']:.2f} 分）")
                                 else:
                                     st.write("目前資料中沒有分數相近的學校與科系可推薦。")
-                                prompt = f"使用者的加權總分為 {weighted_total:.2f}，未達到 {school_name} 的 {department_name} 錄取總分 {admission_score:.2f}，請提供建議或鼓勵的話。"
-                                response = openai.ChatCompletion.create(
-                                    model="gpt-3.5-turbo",
-                                    messages=[{"role": "user", "content": prompt}],
-                                    max_tokens=500
-                                )
+                                prompt = shortfall_prompt(weighted_total, school_name, department_name, admission_score)
                                 st.write("### AI 建議")
-                                st.write(response.choices[0].message["content"])
+                                show_ai_response(prompt, fallback=department_summary(selected_rows.iloc[pos]))
 
-# 在性向測驗分頁中
-with tab2:
+# 性向測驗分頁（fragment：拉動題目的滑桿只重跑這個分頁）
+@st.fragment
+def aptitude_tab():
     st.markdown("### 🧠 性向測驗")
     st.markdown("透過回答以下問題，了解自己的興趣傾向，找到最適合的科系！")
     
@@ -449,7 +480,12 @@ with tab2:
             help="1: 非常不同意, 2: 不同意, 3: 普通, 4: 同意, 5: 非常同意"
         )
     
+    aptitude_inputs = tuple(answers.values())
     if st.button("分析性向", key="analyze_personality"):
+        st.session_state.aptitude_inputs = aptitude_inputs
+        st.session_state.ai_failures = {}
+    # 結果保留到答案改變為止（AI 回覆在背景完成時會重跑整頁）
+    if st.session_state.get("aptitude_inputs") == aptitude_inputs:
         # 計算各領域得分
         scores = {
             "理工": (answers["Q1"] + answers["Q2"] + answers["Q6"]) / 3,
@@ -465,26 +501,8 @@ with tab2:
         # 顯示結果
         st.markdown("### 📊 測驗結果")
         
-        # 創建雷達圖
-        fig, ax = plt.subplots(figsize=(8, 6), subplot_kw=dict(polar=True))
-        
-        categories = list(scores.keys())
-        values = list(scores.values())
-        
-        # 計算角度
-        angles = [n / float(len(categories)) * 2 * 3.14159 for n in range(len(categories))]
-        angles += angles[:1]
-        values += values[:1]
-        
-        # 繪製雷達圖
-        ax.plot(angles, values, linewidth=2, linestyle='solid')
-        ax.fill(angles, values, alpha=0.4)
-        
-        # 設定標籤
-        plt.xticks(angles[:-1], categories)
-        ax.set_ylim(0, 5)
-        
-        st.pyplot(fig)
+        # 雷達圖
+        st.image(aptitude_radar(scores), width="stretch")
         
         # 顯示建議
         st.markdown(f"### 🎯 建議科系方向")
@@ -504,12 +522,14 @@ with tab2:
             st.write(f"- {dept}")
         
         # 使用 AI 提供更詳細的建議
-        prompt = f"使用者的性向測驗結果顯示最適合的領域是{max_field[0]}，請提供關於這個領域的詳細建議，包括：1. 該領域的特點 2. 適合的人格特質 3. 未來發展方向 4. 學習建議"
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=500
-        )
+        prompt = aptitude_prompt(max_field[0])
         
         st.markdown("### 💡 AI 建議")
-        st.write(response.choices[0].message["content"])
+        show_ai_response(prompt, fallback=field_summary(max_field[0], field_suggestions[max_field[0]]))
+
+
+with tab1:
+    admission_tab()
+
+with tab2:
+    aptitude_tab()
@@ -0,0 +1,206 @@
+"""頁面上的 matplotlib 圖表與已繪製圖片的快取。
+
+圖表完全由輸入資料決定，所以以「圖表種類 + 輸入資料指紋」為鍵保存繪製好的 PNG，
+重複顯示同一張圖時直接回傳圖片，不必重新排版與點陣化。快取依總位元組數上限
+淘汰最久沒用到的圖片（LRU），上限可用 CHART_CACHE_MAX_BYTES 調整（預設 64 MB）。
+
+圖表一律以 Agg 繪製在獨立的 Figure 上（不經過 pyplot 的全域圖表管理器），
+open_figure 離開時就釋放圖表，長時間執行也不會累積未關閉的 Figure；
+live_figure_count() 回傳目前仍開啟的圖表數，可用 soak_test.py 驗證記憶體不會成長。
+字型與 rcParams 在載入本模組時由 mpl_setup.init_matplotlib() 設定一次。
+"""
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from mpl_setup import init_matplotlib
+
+init_matplotlib()
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# 與 st.pyplot 的預設輸出一致
+SAVEFIG_OPTIONS = {"format": "png", "bbox_inches": "tight", "dpi": 200}
+
+
+def fingerprint(*inputs):
+    """輸入資料的雜湊值；DataFrame/Series 以內容計算，其他值以 repr 計算。"""
+    h = hashlib.sha1()
+    for value in inputs:
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            h.update(repr(list(value.columns) if isinstance(value, pd.DataFrame) else value.name).encode())
+            h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        elif isinstance(value, np.ndarray):
+            h.update(repr((value.dtype.str, value.shape)).encode())
+            h.update(np.ascontiguousarray(value).tobytes())
+        else:
+            h.update(repr(value).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class ChartCache:
+    """以總位元組數為上限的 LRU 圖片快取，可在多個執行緒間共用。"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+            return image
+
+    def set(self, key, image):
+        if len(image) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._images.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._images[key] = image
+            self.size += len(image)
+            while self.size > self.max_bytes:
+                _, evicted = self._images.popitem(last=False)
+                self.size -= len(evicted)
+
+    def __len__(self):
+        return len(self._images)
+
+
+chart_cache = ChartCache(int(os.getenv("CHART_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)))
+
+_open_figures = 0
+_open_figures_lock = threading.Lock()
+
+
+def _count_open(delta):
+    global _open_figures
+    with _open_figures_lock:
+        _open_figures += delta
+
+
+def live_figure_count():
+    """目前仍開啟的圖表數（本模組開啟的 Figure 加上 pyplot 管理的 Figure）。"""
+    return _open_figures + len(plt.get_fignums())
+
+
+@contextmanager
+def open_figure(figsize, polar=False):
+    """建立只用 Agg 繪製的 Figure 與一個 Axes，離開時清空並釋放。"""
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    _count_open(1)
+    try:
+        yield fig, fig.add_subplot(polar=polar)
+    finally:
+        fig.clear()
+        _count_open(-1)
+
+
+def render_chart(chart_type, inputs, draw, figsize, polar=False):
+    """回傳 chart_type 圖表的 PNG；快取沒有時以 draw(ax, *inputs) 繪製後存入快取。"""
+    key = (chart_type, fingerprint(*inputs))
+    image = chart_cache.get(key)
+    if image is None:
+        buf = io.BytesIO()
+        with open_figure(figsize, polar) as (fig, ax):
+            draw(ax, *inputs)
+            fig.savefig(buf, **SAVEFIG_OPTIONS)
+        image = buf.getvalue()
+        chart_cache.set(key, image)
+    return image
+
+
+def _draw_admission_score_bars(ax, school_name, department_name, score_112, score_113):
+    years = ['112', '113']
+    scores = [score_112, score_113]
+    bars = ax.bar(years, scores, color=['#4CAF50', '#2196F3'], edgecolor='black', linewidth=1)
+    ax.set_xlabel('學年', fontsize=12)
+    ax.set_ylabel('錄取總分', fontsize=12)
+    ax.set_title(f'{school_name} {department_name}\n錄取總分比較', fontsize=14, pad=10)
+    ax.set_ylim(0, max(scores) * 1.15)
+    ax.grid(True, linestyle='--', alpha=0.7)
+    for bar in bars:
+        yval = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width()/2, yval + 1, f'{yval:.2f}', ha='center', va='bottom', fontsize=10)
+
+
+def admission_score_bars(school_name, department_name, score_112, score_113):
+    """單一校系 112/113 錄取總分柱狀圖。"""
+    return render_chart("admission_score_bars", (school_name, department_name, float(score_112), float(score_113)),
+                        _draw_admission_score_bars, figsize=(6, 4))
+
+
+def _draw_aptitude_radar(ax, categories, values):
+    # 計算角度
+    angles = [n / float(len(categories)) * 2 * 3.14159 for n in range(len(categories))]
+    angles += angles[:1]
+    values = list(values) + list(values[:1])
+
+    # 繪製雷達圖
+    ax.plot(angles, values, linewidth=2, linestyle='solid')
+    ax.fill(angles, values, alpha=0.4)
+
+    # 設定標籤
+    ax.set_xticks(angles[:-1], categories)
+    ax.set_ylim(0, 5)
+
+
+def aptitude_radar(scores):
+    """性向測驗各領域得分雷達圖；scores 為 領域 → 分數。"""
+    return render_chart("aptitude_radar", (tuple(scores.keys()), tuple(scores.values())), _draw_aptitude_radar,
+                        figsize=(8, 6), polar=True)
+
+
+def _draw_score_change_bars(ax, schools, changes):
+    ax.bar(schools, changes, color=['#4CAF50' if x >= 0 else '#F44336' for x in changes])
+    ax.set_ylabel('分數線變化')
+    ax.set_xlabel('學校名稱')
+    ax.set_title('各校錄取分數線變化 (113 - 112)')
+    ax.tick_params(axis='x', labelrotation=90)
+
+
+def score_change_bars(schools, changes):
+    """各校錄取分數線變化 (113 - 112) 柱狀圖。"""
+    return render_chart("score_change_bars", (schools, changes), _draw_score_change_bars, figsize=(10, 5))
+
+
+def _draw_score_distribution(ax, scores_112, scores_113):
+    ax.hist(scores_112.dropna(), bins=30, alpha=0.5, label='112', color='#4CAF50')
+    ax.hist(scores_113.dropna(), bins=30, alpha=0.5, label='113', color='#2196F3')
+    ax.set_xlabel('錄取分數線')
+    ax.set_ylabel('學校數')
+    ax.set_title('112/113 各校錄取分數線分布')
+    ax.legend()
+
+
+def score_distribution(scores_112, scores_113):
+    """112/113 各校錄取分數線分布直方圖。"""
+    return render_chart("score_distribution", (scores_112, scores_113), _draw_score_distribution, figsize=(8, 4))
+
+
+def _draw_choice_pie(ax, counts, title):
+    labels = ['可以上更好學校', '原本就是最佳選擇', '無法比較']
+    colors = ['#FF9999', '#66B2FF', '#CCCCCC']
+    ax.pie(counts, labels=labels, autopct='%1.1f%%', colors=colors, startangle=90)
+    ax.set_title(title)
+
+
+def choice_pie(better_count, same_count, unknown_count, title):
+    """學生選擇比較結果圓餅圖（可以上更好學校 / 原本就是最佳選擇 / 無法比較）。"""
+    return render_chart("choice_pie", ((int(better_count), int(same_count), int(unknown_count)), title),
+                        _draw_choice_pie, figsize=(8, 8))
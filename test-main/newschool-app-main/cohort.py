@@ -0,0 +1,214 @@
+"""科大甄選學生名單的批次計算。
+
+把學生成績組成矩陣 S（學生數 × 5）、校系加權組成矩陣 W（校系數 × 5），
+以 S @ Wᵀ 一次算出所有學生在所有校系的加權總分，除以加權總和後與校系平均比較，
+再用遮罩 argmax 找出每位學生「可錄取且平均最高」的校系。
+學生依 chunk_size 分批計算，記憶體用量只與批次大小和校系數有關。
+
+結果表可用 save_results 寫成 Parquet/CSV/XLSX（見 cohort_batch.py），load_results 讀回 Parquet；
+summarize_results 算出頁面上的統計（各校人數、可以上更好學校/原本就是最佳/無法比較的人數）。
+名單或校系資料只改了少數幾列時，可改用 cohort_incremental.IncrementalCohort 只重算受影響的學生。
+"""
+import os
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from indexes import DepartmentIndex
+from scoring import WEIGHT_COLUMNS, ScoringEngine
+
+# 學生名單的五科成績欄位，順序與 scoring.WEIGHT_COLUMNS 對應
+STUDENT_SCORE_COLUMNS = ['國文分數', '英文分數', '數學B分數', '專一分數', '專二分數']
+
+DEPARTMENT_KEY = ['學校名稱', '系科組學程名稱']
+
+# 原本錄取校系找不到時標示「未找到」的欄位（數值/布林與字串混合）
+NOT_FOUND_COLUMNS = ['原本錄取分數', '原本錄取校系平均', '最佳校系平均是否較高']
+
+# save_results 支援的輸出格式（副檔名）
+RESULT_FORMATS = ('.parquet', '.csv', '.xlsx')
+
+# 每批計算的學生數；每批約佔 chunk_size × 校系數 × 8 bytes × 數個暫存陣列
+DEFAULT_CHUNK_SIZE = 2048
+
+
+class CohortSummary(NamedTuple):
+    """結果表的統計。"""
+    school_counts: pd.Series  # 各最佳可錄取學校的人數（與 value_counts() 相同格式）
+    better: int               # 最佳校系平均較高（可以上更好學校）
+    same: int                 # 原本就是最佳選擇
+    unknown: int              # 原本錄取校系找不到，無法比較
+
+
+class CohortBest(NamedTuple):
+    """每位學生的最佳可錄取校系，陣列長度皆為學生數。"""
+    best_index: np.ndarray         # 最佳校系在 school_weights 中的列位置，-1 表示沒有可錄取的校系
+    totals: np.ndarray             # 該校系的加權總分
+    weighted_averages: np.ndarray  # 該校系的加權平均
+
+
+def build_school_weights(df):
+    """整理各校系的加權、錄取總分數與招生名額（各取第一筆），並帶入該校系第一筆資料的平均。"""
+    columns = [*WEIGHT_COLUMNS, '錄取總分數', *(['招生名額'] if '招生名額' in df.columns else [])]
+    school_weights = df.groupby(DEPARTMENT_KEY).agg({col: 'first' for col in columns}).reset_index()
+    first_rows = df.drop_duplicates(DEPARTMENT_KEY).set_index(DEPARTMENT_KEY)
+    school_weights['平均'] = first_rows['平均'].reindex(
+        pd.MultiIndex.from_frame(school_weights[DEPARTMENT_KEY])).to_numpy()
+    return school_weights
+
+
+def student_score_matrix(students):
+    """學生五科成績矩陣（學生數 × 5），無法轉成數字的成績為 NaN。"""
+    return students[STUDENT_SCORE_COLUMNS].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+
+def best_admissible(engine, student_scores, chunk_size=DEFAULT_CHUNK_SIZE):
+    """對每位學生找出加權平均 >= 校系平均、且校系平均最高的校系。
+
+    平均相同時取 school_weights 中較前面的校系；成績或平均缺值的組合一律視為不可錄取。
+    """
+    student_scores = np.asarray(student_scores, dtype=float)
+    n = len(student_scores)
+    best_index = np.full(n, -1, dtype=np.int64)
+    totals = np.full(n, np.nan)
+    weighted_averages = np.full(n, np.nan)
+    if n == 0 or len(engine) == 0:
+        return CohortBest(best_index, totals, weighted_averages)
+
+    weight_sums = np.where(engine.weight_sums != 0, engine.weight_sums, np.nan)
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        chunk_totals = student_scores[start:stop] @ engine.weights.T
+        chunk_averages = chunk_totals / weight_sums
+        with np.errstate(invalid='ignore'):
+            admissible = chunk_averages >= engine.means
+        candidate = np.where(admissible, engine.means, -np.inf).argmax(axis=1)
+        found = admissible.any(axis=1)
+        rows = np.arange(stop - start)
+        best_index[start:stop] = np.where(found, candidate, -1)
+        totals[start:stop] = np.where(found, chunk_totals[rows, candidate], np.nan)
+        weighted_averages[start:stop] = np.where(found, chunk_averages[rows, candidate], np.nan)
+    return CohortBest(best_index, totals, weighted_averages)
+
+
+def _student_column(students, col, default):
+    if col in students.columns:
+        return students[col].to_numpy(dtype=object)
+    return np.full(len(students), default, dtype=object)
+
+
+def _or_not_found(values, found):
+    # 找不到對應校系的位置填入「未找到」（與原本逐列查詢的顯示方式一致）
+    return pd.Series(values, dtype=object).where(found, '未找到').to_numpy()
+
+
+def analyze_cohort(students, school_weights, admissions, department_index=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """計算學生名單中每位學生的最佳可錄取學校，回傳結果表（沒有可錄取校系的學生不列出）。
+
+    admissions 為該學年度的校系資料，用來查詢學生原本錄取校系的錄取分數與平均；
+    department_index 為 admissions 的 DepartmentIndex，未提供時會臨時建立。
+    """
+    if department_index is None:
+        department_index = DepartmentIndex(admissions)
+    best = best_admissible(ScoringEngine(school_weights), student_score_matrix(students), chunk_size)
+    return result_rows(students, best, school_weights, admissions, department_index)
+
+
+def result_rows(students, best, school_weights, admissions, department_index):
+    """由 best_admissible 的結果組出結果表（只含有可錄取校系的學生，依名單順序）。"""
+    found = best.best_index >= 0
+    students = students[found]
+    best_rows = school_weights.iloc[best.best_index[found]]
+
+    # 原本錄取的校系在 admissions 中的位置（找不到為 -1）
+    orig_pos = department_index.lookup(_student_column(students, '錄取學校', ''),
+                                       _student_column(students, '錄取校系', ''))
+    orig_found = orig_pos >= 0
+    orig_score = admissions['錄取總分數'].to_numpy()[orig_pos]
+    orig_mean = admissions['平均'].to_numpy()[orig_pos]
+    best_mean = best_rows['平均'].to_numpy()
+
+    return pd.DataFrame({
+        '座號': students['座號'].to_numpy(),
+        '班級': students['班級'].to_numpy(),
+        **{col: students[col].to_numpy() for col in STUDENT_SCORE_COLUMNS},
+        '原本錄取學校': _student_column(students, '錄取學校', '未錄取'),
+        '原本錄取校系': _student_column(students, '錄取校系', '未錄取'),
+        '原本錄取分數': _or_not_found(orig_score, orig_found),
+        '原本錄取校系平均': _or_not_found(orig_mean, orig_found),
+        '最佳可錄取學校': best_rows['學校名稱'].to_numpy(),
+        '最佳可錄取科系': best_rows['系科組學程名稱'].to_numpy(),
+        '加權總分': best.totals[found],
+        '加權平均': best.weighted_averages[found],
+        '該校錄取分數': best_rows['錄取總分數'].to_numpy(),
+        '最佳校系平均': best_mean,
+        # 原本錄取校系找得到時比較兩者平均，找不到時標示「未找到」
+        '最佳校系平均是否較高': _or_not_found(best_mean > orig_mean, orig_found),
+    })
+
+
+def choice_categories(results):
+    """每列的比較結果：1 可以上更好學校、0 原本就是最佳選擇、-1 無法比較（「未找到」）。"""
+    higher = results['最佳校系平均是否較高']
+    return np.select([higher == True, higher == '未找到'], [1, -1], 0)
+
+
+def summarize_results(results):
+    """結果表的 CohortSummary。"""
+    categories = choice_categories(results)
+    return CohortSummary(
+        school_counts=results['最佳可錄取學校'].value_counts(),
+        better=int((categories == 1).sum()),
+        same=int((categories == 0).sum()),
+        unknown=int((categories == -1).sum()),
+    )
+
+
+def _to_storable(results):
+    # Parquet 每欄只能有一種型別：「未找到」改存成缺值，另以「原本校系找到」欄記錄
+    found = (results['原本錄取分數'] != '未找到').to_numpy(dtype=bool)
+    return results.assign(
+        原本錄取分數=pd.to_numeric(results['原本錄取分數'].where(found)),
+        原本錄取校系平均=pd.to_numeric(results['原本錄取校系平均'].where(found)),
+        最佳校系平均是否較高=results['最佳校系平均是否較高'].where(found).astype('boolean'),
+        原本校系找到=found,
+    )
+
+
+def _from_storable(stored):
+    found = stored['原本校系找到'].to_numpy(dtype=bool)
+    results = stored.drop(columns='原本校系找到')
+    for col in NOT_FOUND_COLUMNS:
+        results[col] = _or_not_found(results[col].to_numpy(dtype=object), found)
+    return results
+
+
+def save_results(results, path, attrs=None):
+    """依副檔名把 analyze_cohort 的結果表寫成 .parquet、.csv 或 .xlsx（先寫暫存檔再取代）。
+
+    attrs 為要一併記錄的資訊（例如來源檔版本），只有 Parquet 會保存。
+    """
+    root, ext = os.path.splitext(path)
+    ext = ext.lower()
+    tmp_path = f"{root}.tmp{ext}"
+    if ext == '.parquet':
+        stored = _to_storable(results)
+        stored.attrs = dict(attrs or {})
+        stored.to_parquet(tmp_path, index=False)
+    elif ext == '.csv':
+        # 加上 BOM，Excel 開啟中文才不會亂碼
+        results.to_csv(tmp_path, index=False, encoding='utf-8-sig')
+    elif ext == '.xlsx':
+        results.to_excel(tmp_path, index=False)
+    else:
+        raise ValueError(f"不支援的輸出格式：{path}（請使用 {'、'.join(RESULT_FORMATS)}）")
+    os.replace(tmp_path, path)
+
+
+def load_results(path):
+    """讀回 save_results 寫出的 Parquet，回傳結果表；寫入時的 attrs 保留在 DataFrame.attrs。"""
+    stored = pd.read_parquet(path)
+    results = _from_storable(stored)
+    results.attrs = dict(stored.attrs)
+    return results
@@ -0,0 +1,118 @@
+"""科大甄選學生名單的批次分析（不需開啟網頁）。
+
+讀取學生名單活頁簿，以指定學年度的校系資料找出每位學生的最佳可錄取校系
+（最佳可錄取學校、加權平均、最佳校系平均是否較高……），依副檔名寫成 Parquet、CSV 或 XLSX。
+名單以 openpyxl 唯讀模式逐段讀取（每段 --rows-per-task 列），讀到一段就交給行程池計算，
+同時處理中的段數有上限，讀檔與計算的記憶體只與每段列數有關；輸出 CSV 時結果也逐段寫出。
+
+沒有指定 --output 時寫到 cohort_results/<學年度>.parquet 並記錄來源檔版本；
+科大甄選分析頁面載入時若來源檔沒有變動，就直接使用這份結果，不再即時計算。
+
+    python cohort_batch.py 113科大甄選.xlsx --year 113
+    python cohort_batch.py 全區名單.xlsx --year 113 --output 全區結果.xlsx --workers 8
+"""
+import argparse
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from cohort import RESULT_FORMATS, analyze_cohort, build_school_weights, save_results
+from datasets import (ADMISSION_FILES, COHORT_RESULTS_DIR, DEFAULT_CHUNK_ROWS, cohort_results_attrs,
+                      cohort_results_path, get_admission_table, get_department_index, iter_cohort_workbook)
+from excel_cache import cache_path
+from indexes import DepartmentIndex
+
+logger = logging.getLogger(__name__)
+
+# 子行程共用的校系資料（由 _init_worker 設定，每個行程只傳一次）
+_worker_state = None
+
+
+def _init_worker(school_weights, admissions, year):
+    global _worker_state
+    _worker_state = (school_weights, admissions, DepartmentIndex(admissions, year))
+
+
+def _analyze_chunk(students):
+    school_weights, admissions, department_index = _worker_state
+    return analyze_cohort(students, school_weights, admissions, department_index)
+
+
+def analyze_chunks(chunks, year, workers):
+    """依序產生每段學生（chunks 中的 DataFrame）的分析結果，欄位與 analyze_cohort 的結果表相同。
+
+    學生彼此獨立，各段結果依原順序接起來即為完整結果。workers > 1 時以行程池平行計算，
+    最多同時有 2 × workers 段在處理中，讀檔不會遠遠超前計算。
+    """
+    admissions = get_admission_table(year)
+    school_weights = build_school_weights(admissions)
+    if workers <= 1:
+        department_index = get_department_index(year)
+        for students in chunks:
+            yield analyze_cohort(students, school_weights, admissions, department_index)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(school_weights, admissions, year)) as pool:
+        in_flight = deque()
+        for students in chunks:
+            in_flight.append(pool.submit(_analyze_chunk, students))
+            if len(in_flight) >= 2 * workers:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def write_csv_chunks(frames, path):
+    """把各段結果依序附加寫入 CSV（先寫暫存檔再取代），回傳總列數。"""
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.tmp{ext}"
+    count = 0
+    with open(tmp_path, "w", encoding="utf-8-sig", newline="") as f:
+        for i, frame in enumerate(frames):
+            frame.to_csv(f, index=False, header=(i == 0))
+            count += len(frame)
+    os.replace(tmp_path, path)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析科大甄選學生名單，找出每位學生的最佳可錄取校系")
+    parser.add_argument("workbook", help="學生名單活頁簿（.xlsx）")
+    parser.add_argument("--year", required=True, choices=list(ADMISSION_FILES), help="使用哪一學年度的校系資料")
+    parser.add_argument("--sheet", default="工作表1")
+    parser.add_argument("--output", help="輸出檔（.parquet/.csv/.xlsx），預設為 cohort_results/<學年度>.parquet")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--rows-per-task", type=int, default=DEFAULT_CHUNK_ROWS, help="每段讀取與計算的學生數")
+    args = parser.parse_args()
+
+    if args.output and os.path.splitext(args.output)[1].lower() not in RESULT_FORMATS:
+        parser.error(f"不支援的輸出格式：{args.output}（請使用 {'、'.join(RESULT_FORMATS)}）")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    started = time.perf_counter()
+    chunks = iter_cohort_workbook(args.workbook, args.sheet, args.rows_per_task)
+    frames = analyze_chunks(chunks, args.year, args.workers)
+
+    output = args.output
+    attrs = cohort_results_attrs(args.year, cache_path(args.workbook, args.sheet))
+    if output is None:
+        os.makedirs(COHORT_RESULTS_DIR, exist_ok=True)
+        output = cohort_results_path(args.year)
+        if attrs != cohort_results_attrs(args.year):
+            logger.warning("%s 不是頁面使用的 %s 學年度名單，頁面不會採用這份結果", args.workbook, args.year)
+    if output.lower().endswith(".csv"):
+        count = write_csv_chunks(frames, output)
+    else:
+        results = pd.concat(frames, ignore_index=True)
+        count = len(results)
+        save_results(results, output, attrs)
+    logger.info("已寫出 %s：%d 位學生有可錄取的校系（%.2fs）", output, count, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
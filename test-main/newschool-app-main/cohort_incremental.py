@@ -0,0 +1,198 @@
+"""科大甄選分析的增量計算。
+
+名單或校系資料只改了幾列時（例如老師修正某位學生的英文分數），不必重新計算全部學生 × 全部校系。
+IncrementalCohort 記住上次每位學生的結果，並以雜湊值（指紋）辨識每一列學生資料、
+每個校系的加權與平均、每個校系的錄取分數與平均：
+
+- 指紋沒變的學生沿用上次的結果，新增或修改過的學生重新計算。
+- 校系的加權或平均有變動時，只重算可能受影響的學生：最佳校系被修改或刪除的學生，
+  以及對變動的校系可錄取、且該校系平均不低於目前最佳校系的學生（只需計算學生 × 變動的校系）。
+- 校系的錄取分數或平均有變動時，另外重算原本錄取該校系的學生。
+
+結果表與統計（各校人數、可以上更好學校/原本就是最佳/無法比較的人數）在上次的基礎上修補，
+與 analyze_cohort、summarize_results 重新計算的結果相同。
+"""
+import threading
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from cohort import (DEFAULT_CHUNK_SIZE, DEPARTMENT_KEY, NOT_FOUND_COLUMNS, STUDENT_SCORE_COLUMNS, CohortSummary,
+                    analyze_cohort, best_admissible, choice_categories, result_rows, student_score_matrix)
+from indexes import DepartmentIndex
+from scoring import WEIGHT_COLUMNS, ScoringEngine
+
+# 會影響學生結果的名單欄位
+STUDENT_COLUMNS = ['座號', '班級', *STUDENT_SCORE_COLUMNS, '錄取學校', '錄取校系']
+
+# 會影響最佳校系判斷的 school_weights 欄位，與查詢原本錄取校系時用到的 admissions 欄位
+WEIGHT_VALUE_COLUMNS = [*WEIGHT_COLUMNS, '錄取總分數', '平均']
+ADMISSION_VALUE_COLUMNS = ['錄取總分數', '平均']
+
+
+def row_fingerprints(df, columns):
+    """每列在 columns（缺少的欄位略過）上的 64 位元雜湊值。"""
+    return pd.util.hash_pandas_object(df[[col for col in columns if col in df.columns]], index=False).to_numpy()
+
+
+def department_keys(df, columns=DEPARTMENT_KEY):
+    """每列 (學校, 科系) 的雜湊值，用來代表校系（學生的「錄取學校, 錄取校系」也可用同樣方式計算）。"""
+    return row_fingerprints(df, columns)
+
+
+def _department_fingerprints(df, columns):
+    # 校系 → 指紋；同一校系有多列時取第一列，與 build_school_weights、DepartmentIndex 一致
+    df = df.drop_duplicates(DEPARTMENT_KEY)
+    return dict(zip(department_keys(df), row_fingerprints(df, columns)))
+
+
+def _changed(old, new):
+    # 新增、刪除或指紋改變的校系
+    return np.array([key for key in old.keys() | new.keys() if old.get(key) != new.get(key)], dtype=np.uint64)
+
+
+def _original_keys(students):
+    if '錄取學校' not in students.columns or '錄取校系' not in students.columns:
+        return np.zeros(len(students), dtype=np.uint64)
+    return department_keys(students, ['錄取學校', '錄取校系'])
+
+
+class IncrementalCohort:
+    """保存上次的分析結果，update() 時只重算資料有變動的學生；可在多個執行緒間共用。"""
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.last_recomputed = 0    # 上次 update() 重新計算的學生數
+        self._lock = threading.Lock()
+        self._fingerprints = None   # 每位學生的指紋（名單順序）
+        self._found = None          # 是否有可錄取的校系
+        self._best_keys = None      # 最佳校系的 department_keys 雜湊值（沒有可錄取校系時無意義）
+        self._best_means = None     # 最佳校系平均，沒有時為 NaN
+        self._original_keys = None  # 原本錄取校系的雜湊值
+        self._rows = None           # 有可錄取校系的學生結果列，索引為學生在名單中的位置
+        self._weight_fingerprints = {}
+        self._admission_fingerprints = {}
+        self._school_counts = Counter()
+        self._choices = Counter()
+
+    def update(self, students, school_weights, admissions, department_index=None):
+        """以新的名單與校系資料更新，回傳 (結果表, CohortSummary)，與重新執行 analyze_cohort 的結果相同。"""
+        if department_index is None:
+            department_index = DepartmentIndex(admissions)
+        with self._lock:
+            fingerprints = row_fingerprints(students, STUDENT_COLUMNS)
+            weight_fingerprints = _department_fingerprints(school_weights, WEIGHT_VALUE_COLUMNS)
+            admission_fingerprints = _department_fingerprints(admissions, ADMISSION_VALUE_COLUMNS)
+
+            previous = self._match(fingerprints)
+            recompute = previous < 0
+            reused = np.flatnonzero(~recompute)
+            if len(reused):
+                recompute[reused] = self._affected(
+                    previous[reused], students.iloc[reused], school_weights,
+                    _changed(self._weight_fingerprints, weight_fingerprints),
+                    _changed(self._admission_fingerprints, admission_fingerprints))
+            self._apply(students, previous, np.flatnonzero(recompute), school_weights, admissions, department_index)
+
+            self._fingerprints = fingerprints
+            self._weight_fingerprints = weight_fingerprints
+            self._admission_fingerprints = admission_fingerprints
+            self.last_recomputed = int(recompute.sum())
+            return self._rows.reset_index(drop=True), self.summary()
+
+    def summary(self):
+        """目前結果的 CohortSummary（由修補後的計數組成）。"""
+        counts = {school: count for school, count in self._school_counts.items() if count > 0}
+        school_counts = pd.Series(list(counts.values()), index=pd.Index(list(counts), name='最佳可錄取學校'),
+                                  dtype='int64', name='count').sort_values(ascending=False, kind='stable')
+        return CohortSummary(school_counts, self._choices[1], self._choices[0], self._choices[-1])
+
+    def _match(self, fingerprints):
+        # 每位學生在上次名單中指紋相同的位置（重複的指紋對到第一個），沒有時為 -1
+        if self._fingerprints is None or len(self._fingerprints) == 0:
+            return np.full(len(fingerprints), -1)
+        first = ~pd.Index(self._fingerprints).duplicated()
+        positions = pd.Index(self._fingerprints[first]).get_indexer(fingerprints)
+        return np.where(positions >= 0, np.flatnonzero(first)[np.maximum(positions, 0)], -1)
+
+    def _affected(self, previous, students, school_weights, changed_weights, changed_admissions):
+        """沿用上次結果的學生中，因校系變動而需要重算者的遮罩。"""
+        affected = np.zeros(len(previous), dtype=bool)
+        if len(changed_weights):
+            # 最佳校系被修改或刪除
+            affected |= self._found[previous] & np.isin(self._best_keys[previous], changed_weights)
+            # 對新增或修改後的校系可錄取，且平均不低於目前的最佳校系（平均相同時名次可能改變）
+            changed_rows = school_weights[np.isin(department_keys(school_weights), changed_weights)]
+            if len(changed_rows):
+                engine = ScoringEngine(changed_rows)
+                best = best_admissible(engine, student_score_matrix(students), self.chunk_size)
+                candidate_means = np.where(best.best_index >= 0, engine.means[np.maximum(best.best_index, 0)], -np.inf)
+                current_means = np.nan_to_num(self._best_means[previous], nan=-np.inf)
+                # 對變動的校系沒有可錄取者不受影響（-inf >= -inf 不能算進來）
+                affected |= (best.best_index >= 0) & (candidate_means >= current_means)
+        if len(changed_admissions):
+            # 原本錄取校系的錄取分數或平均改變
+            affected |= np.isin(self._original_keys[previous], changed_admissions)
+        return affected
+
+    def _apply(self, students, previous, recompute, school_weights, admissions, department_index):
+        """重算 recompute 位置的學生，與沿用的結果合併，並修補統計。"""
+        n = len(students)
+        keep = np.ones(n, dtype=bool)
+        keep[recompute] = False
+        kept = np.flatnonzero(keep)
+
+        found = np.zeros(n, dtype=bool)
+        best_keys = np.zeros(n, dtype=np.uint64)
+        best_means = np.full(n, np.nan)
+        frames = []
+        if len(kept):
+            old = previous[kept]
+            found[kept] = self._found[old]
+            best_keys[kept] = self._best_keys[old]
+            best_means[kept] = self._best_means[old]
+            kept_found = kept[found[kept]]
+            carried = self._rows.loc[previous[kept_found]]
+            carried.index = kept_found
+            frames.append(carried)
+            # 上次的結果列被沿用 0 次（學生刪除或重算）或多次（指紋相同的學生）時修補計數
+            uses = np.bincount(previous[kept_found], minlength=len(self._found))
+            changed_rows = np.flatnonzero(self._found & (uses != 1))
+            self._count(self._rows.loc[changed_rows], uses[changed_rows] - 1)
+        else:
+            self._school_counts.clear()
+            self._choices.clear()
+
+        if len(recompute):
+            subset = students.iloc[recompute]
+            best = best_admissible(ScoringEngine(school_weights), student_score_matrix(subset), self.chunk_size)
+            sub_found = best.best_index >= 0
+            found[recompute] = sub_found
+            best_positions = best.best_index[sub_found]
+            best_keys[recompute[sub_found]] = department_keys(school_weights)[best_positions]
+            best_means[recompute[sub_found]] = school_weights['平均'].to_numpy()[best_positions]
+            fresh = result_rows(subset, best, school_weights, admissions, department_index)
+            fresh.index = recompute[sub_found]
+            frames.append(fresh)
+            self._count(fresh, np.ones(len(fresh), dtype=int))
+
+        frames = [frame for frame in frames if len(frame)]
+        if frames:
+            rows = pd.concat(frames).sort_index()
+            # 合併後重新推斷「未找到」欄的型別（全為字串時與 analyze_cohort 一樣是字串欄）
+            for col in NOT_FOUND_COLUMNS:
+                if rows[col].dtype == object:
+                    rows[col] = pd.Series(rows[col].to_numpy(), index=rows.index)
+            self._rows = rows
+        else:
+            self._rows = analyze_cohort(students.iloc[:0], school_weights, admissions, department_index)
+        self._found = found
+        self._best_keys = best_keys
+        self._best_means = best_means
+        self._original_keys = _original_keys(students)
+
+    def _count(self, rows, weights):
+        for school, category, weight in zip(rows['最佳可錄取學校'], choice_categories(rows), weights):
+            self._school_counts[school] += int(weight)
+            self._choices[int(category)] += int(weight)
@@ -0,0 +1,369 @@
+"""各頁面共用的資料表。
+
+每個年度的校系資料與科大甄選名單，以及由它們建立的索引與計算結果，在整個行程中只建立一次
+（st.cache_resource），所有 session 與頁面共用同一份；資料檔更新後會自動重新載入。
+對外提供的是淺層複本：共用底層資料、不額外佔記憶體，
+頁面在複本上新增或修改欄位也不會影響共用的原表（Copy-on-Write）。
+"""
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from cohort import build_school_weights, load_results, summarize_results
+from cohort_incremental import IncrementalCohort
+from excel_cache import cache_path, read_excel_cached
+from facets import add_school_facets
+from indexes import DepartmentIndex, ScoreIndex, SubjectWeightIndex
+from multi_year import build_multi_year_tables
+from placement import place_cohort
+from scoring import ScoringEngine
+
+logger = logging.getLogger(__name__)
+
+# pandas 3 起 Copy-on-Write 為預設行為；較舊版本需手動開啟，淺層複本才不會改到共用資料
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 各學年度校系錄取資料：(檔名, 工作表)
+ADMISSION_FILES = {
+    "113": ("11309a (1).xlsx", "Sheet1"),
+    "112": ("11209.xlsx", "工作表1"),
+}
+
+# 各學年度科大甄選學生名單：(檔名, 工作表)
+COHORT_FILES = {
+    "113": ("113科大甄選.xlsx", "工作表1"),
+    "112": ("112科大甄選.xlsx", "工作表1"),
+}
+
+# cohort_batch.py 預先計算的科大甄選分析結果：<學年度>.parquet
+COHORT_RESULTS_DIR = os.path.join(BASE_DIR, "cohort_results")
+
+# 校系資料中需要轉成數值的欄位（注意部分欄位名稱前有空白，與 Excel 原始欄名一致）
+ADMISSION_NUMERIC_COLUMNS = [
+    '國文加權', ' 英文加權', ' 數學加權', ' 專業(一)加權', ' 專業(二)加權',
+    '錄取總分數', '錄取總分數(沒加權)', '平均',
+]
+
+# 學生名單中需要轉成數值的成績欄位
+COHORT_NUMERIC_COLUMNS = ['國文分數', '英文分數', '數學B分數', '專一分數', '專二分數']
+
+# 逐段讀取學生名單時每段的列數
+DEFAULT_CHUNK_ROWS = 5000
+
+
+class LoadTiming(NamedTuple):
+    """一個資料檔的載入紀錄。"""
+    file_name: str
+    seconds: float
+    attempts: int
+
+
+# 最近的資料檔載入時間，供監控或除錯查看
+recent_load_timings = deque(maxlen=50)
+
+
+def read_excel_with_retry(file_path, sheet_name, max_retries=3, backoff=0.5):
+    """讀取 Excel（經由 Parquet 快取），檔案被其他程式鎖住時以指數退避（0.5、1、2… 秒）重試。
+
+    載入時間記錄在 recent_load_timings。
+    """
+    started = time.perf_counter()
+    for attempt in range(1, max_retries + 1):
+        try:
+            df = read_excel_cached(file_path, sheet_name=sheet_name)
+        except PermissionError:
+            if attempt == max_retries:
+                raise
+            delay = backoff * 2 ** (attempt - 1)
+            logger.warning("無法讀取文件 %s，%.1f 秒後重試... (嘗試 %d/%d)", file_path, delay, attempt, max_retries)
+            time.sleep(delay)
+        else:
+            timing = LoadTiming(os.path.basename(file_path), time.perf_counter() - started, attempt)
+            recent_load_timings.append(timing)
+            logger.info("已載入 %s（%.3fs，第 %d 次嘗試）", timing.file_name, timing.seconds, attempt)
+            return df
+
+
+def load_in_parallel(*calls):
+    """同時執行多個載入呼叫（如 (get_admission_table, "113")），依序回傳結果；任一失敗時拋出該例外。
+
+    每個呼叫在自己的執行緒中讀檔與重試（重試等待只佔用該檔的執行緒），總載入時間約為最慢的那一個檔案。
+    """
+    ctx = get_script_run_ctx()
+
+    def run(call):
+        # 讓工作執行緒沿用目前頁面的執行環境（st.cache_resource 需要）
+        if ctx is not None:
+            add_script_run_ctx(ctx=ctx)
+        func, *args = call
+        return func(*args)
+
+    with ThreadPoolExecutor(max_workers=len(calls), thread_name_prefix="load") as pool:
+        return list(pool.map(run, calls))
+
+
+def _coerce_numeric(df, columns):
+    for col in columns:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+
+def _source(files, year):
+    file_name, sheet_name = files[year]
+    return os.path.join(BASE_DIR, file_name), sheet_name
+
+
+def _source_key(files, year):
+    # 以快取檔路徑（含 mtime 與內容雜湊）作為資源快取的鍵，Excel 更新後會自動重新載入
+    path, sheet_name = _source(files, year)
+    return cache_path(path, sheet_name)
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _load_admission_table(year, source_key):
+    path, sheet_name = _source(ADMISSION_FILES, year)
+    return add_school_facets(_coerce_numeric(read_excel_with_retry(path, sheet_name), ADMISSION_NUMERIC_COLUMNS))
+
+
+def read_cohort_workbook(path, sheet_name):
+    """讀取科大甄選學生名單活頁簿並轉換成績欄位的型態。"""
+    return _coerce_numeric(read_excel_with_retry(path, sheet_name), COHORT_NUMERIC_COLUMNS)
+
+
+def _cell_value(cell):
+    # 與 pd.read_excel（openpyxl）相同的儲存格轉換：空白為 ""、錯誤值為 NaN、整數值的數字轉成 int
+    if cell.value is None:
+        return ""
+    if cell.data_type == "e":
+        return np.nan
+    if cell.data_type == "n" and int(cell.value) == cell.value:
+        return int(cell.value)
+    return cell.value
+
+
+def _infer_column(values):
+    # 與 pd.read_excel 相同：整欄都是數字（含 '03' 這類數字字串）時轉成數值欄，否則保留文字
+    try:
+        return pd.to_numeric(values)
+    except (ValueError, TypeError):
+        return values.infer_objects()
+
+
+def _data_rows(rows, width):
+    # 補齊到欄名寬度；全空的列先記下數量，後面還有資料列時才補上（結尾的全空列略過）
+    blank_rows = 0
+    for row in rows:
+        values = [_cell_value(cell) for cell in row[:width]]
+        if all(value == "" for value in values):
+            blank_rows += 1
+            continue
+        for _ in range(blank_rows):
+            yield [""] * width
+        blank_rows = 0
+        yield values + [""] * (width - len(values))
+
+
+def iter_cohort_workbook(path, sheet_name, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """逐段讀取學生名單活頁簿，每段為最多 chunk_rows 列、已轉換成績欄位型態的 DataFrame。
+
+    以 openpyxl 唯讀模式逐列解析（不經過 Parquet 快取），記憶體只與 chunk_rows 有關，適合很大的名單。
+    成績欄位以 read_cohort_workbook 相同的 pd.to_numeric 轉換；其餘欄位空白視為缺值，
+    整欄可轉成數字時轉成數值欄，與 pd.read_excel 的推斷規則相同。
+    第一列為欄名，超出欄名的儲存格與結尾的全空列略過（中間的全空列與 pd.read_excel 一樣保留為缺值列）；
+    名單沒有資料列時仍會產生一段空的 DataFrame。
+
+    某一欄在某段中全為缺值時，該段的型態為 float64，各段合併後以 infer_objects() 重新推斷，
+    即與 read_cohort_workbook 讀取整份名單的結果相同。
+    """
+    from openpyxl import load_workbook
+
+    def parse(rows):
+        df = pd.DataFrame(rows, columns=header, dtype=object)
+        if rows:
+            df = df.replace("", np.nan)
+            for i in range(df.shape[1]):
+                df.isetitem(i, _infer_column(df.iloc[:, i]))
+        return _coerce_numeric(df, COHORT_NUMERIC_COLUMNS)
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows()
+        header = [_cell_value(cell) for cell in next(rows, ())]
+        width = len(header)
+        chunk = []
+        yielded = False
+        for values in _data_rows(rows, width):
+            chunk.append(values)
+            if len(chunk) == chunk_rows:
+                yield parse(chunk)
+                chunk = []
+                yielded = True
+        if chunk or not yielded:
+            yield parse(chunk)
+    finally:
+        workbook.close()
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _load_cohort_table(year, source_key):
+    return read_cohort_workbook(*_source(COHORT_FILES, year))
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _load_department_index(year, source_key):
+    return DepartmentIndex(_load_admission_table(year, source_key), year)
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _load_score_index(year, metric, source_key):
+    return ScoreIndex(_load_admission_table(year, source_key)[metric])
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _load_subject_weight_index(year, source_key):
+    return SubjectWeightIndex(_load_admission_table(year, source_key))
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _load_scoring_engine(year, source_key):
+    return ScoringEngine(_load_admission_table(year, source_key))
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _load_multi_year_tables(source_key_113, source_key_112):
+    return build_multi_year_tables(_load_admission_table("113", source_key_113),
+                                   _load_admission_table("112", source_key_112))
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _load_multi_year_engine(source_key_113, source_key_112):
+    return ScoringEngine(_load_multi_year_tables(source_key_113, source_key_112).departments)
+
+
+def cohort_results_path(year):
+    return os.path.join(COHORT_RESULTS_DIR, f"{year}.parquet")
+
+
+def cohort_results_attrs(year, cohort_key=None, admission_key=None):
+    """預先計算的結果中記錄的來源版本（以快取檔名代表來源檔的路徑與內容）；未指定的來源為頁面使用的資料檔。"""
+    cohort_key = cohort_key or _source_key(COHORT_FILES, year)
+    admission_key = admission_key or _source_key(ADMISSION_FILES, year)
+    return {
+        "year": year,
+        "cohort_source": os.path.basename(cohort_key),
+        "admission_source": os.path.basename(admission_key),
+    }
+
+
+def _read_precomputed_cohort_results(year, cohort_key, admission_key):
+    path = cohort_results_path(year)
+    if not os.path.exists(path):
+        return None
+    try:
+        results = load_results(path)
+    except Exception as e:
+        logger.warning("無法讀取預先計算的結果 %s，改為即時計算：%s", path, e)
+        return None
+    if results.attrs != cohort_results_attrs(year, cohort_key, admission_key):
+        logger.info("預先計算的結果 %s 與目前的資料檔不符，改為即時計算", path)
+        return None
+    return results
+
+
+@st.cache_resource(show_spinner=False)
+def _cohort_engine(year):
+    # 每個學年度一個，保存上次的結果；資料檔更新後只重算有變動的學生
+    return IncrementalCohort()
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _load_cohort_results(year, cohort_key, admission_key):
+    results = _read_precomputed_cohort_results(year, cohort_key, admission_key)
+    if results is not None:
+        return results, summarize_results(results)
+    admissions = _load_admission_table(year, admission_key)
+    engine = _cohort_engine(year)
+    results, summary = engine.update(_load_cohort_table(year, cohort_key), build_school_weights(admissions),
+                                     admissions, _load_department_index(year, admission_key))
+    logger.info("%s 學年度科大甄選分析：重新計算 %d 位學生", year, engine.last_recomputed)
+    return results, summary
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _load_cohort_placement(year, cohort_key, admission_key):
+    admissions = _load_admission_table(year, admission_key)
+    return place_cohort(_load_cohort_table(year, cohort_key), build_school_weights(admissions))
+
+
+def get_admission_table(year):
+    """取得某學年度（"113"/"112"）已轉型的校系資料（共用資料的唯讀淺層複本）。"""
+    return _load_admission_table(year, _source_key(ADMISSION_FILES, year)).copy(deep=False)
+
+
+def get_cohort_table(year):
+    """取得某學年度（"113"/"112"）已轉型的科大甄選學生名單（共用資料的唯讀淺層複本）。"""
+    return _load_cohort_table(year, _source_key(COHORT_FILES, year)).copy(deep=False)
+
+
+def get_cohort_results(year):
+    """取得某學年度科大甄選名單的分析結果（analyze_cohort 的結果表，共用資料的唯讀淺層複本）。
+
+    來源檔版本相符時直接使用 cohort_batch.py 預先算好的結果，否則以 cohort_incremental.IncrementalCohort
+    計算（資料檔更新時只重算有變動的學生）。
+    """
+    results, _ = _load_cohort_results(year, _source_key(COHORT_FILES, year), _source_key(ADMISSION_FILES, year))
+    return results.copy(deep=False)
+
+
+def get_cohort_summary(year):
+    """取得某學年度科大甄選分析結果的 CohortSummary（各校人數與比較結果人數）。"""
+    _, summary = _load_cohort_results(year, _source_key(COHORT_FILES, year), _source_key(ADMISSION_FILES, year))
+    return summary
+
+
+def get_cohort_placement(year):
+    """取得某學年度科大甄選名單依招生名額分發的結果表（見 placement.place_cohort，共用資料的唯讀淺層複本）。"""
+    placement = _load_cohort_placement(year, _source_key(COHORT_FILES, year), _source_key(ADMISSION_FILES, year))
+    return placement.copy(deep=False)
+
+
+def get_department_index(year):
+    """取得某學年度校系資料的 (學校名稱, 系科組學程名稱, 學年度) → 列位置 索引。"""
+    return _load_department_index(year, _source_key(ADMISSION_FILES, year))
+
+
+def get_score_index(year, metric):
+    """取得某學年度校系資料依 metric 欄位（如「平均」、「錄取總分數」）排序的 ScoreIndex。"""
+    return _load_score_index(year, metric, _source_key(ADMISSION_FILES, year))
+
+
+def get_subject_weight_index(year):
+    """取得某學年度校系資料的各科加權排序索引（SubjectWeightIndex）。"""
+    return _load_subject_weight_index(year, _source_key(ADMISSION_FILES, year))
+
+
+def get_scoring_engine(year):
+    """取得某學年度校系資料的 ScoringEngine（列位置與校系資料表相同）。"""
+    return _load_scoring_engine(year, _source_key(ADMISSION_FILES, year))
+
+
+def get_multi_year_tables():
+    """取得 112/113 合併後的 MultiYearTables（見 multi_year.py；各表為淺層複本）。"""
+    return _load_multi_year_tables(_source_key(ADMISSION_FILES, "113"), _source_key(ADMISSION_FILES, "112")).copy()
+
+
+def get_multi_year_engine():
+    """取得 112/113 合併 departments 表的 ScoringEngine（列位置與 get_multi_year_tables().departments 相同）。"""
+    return _load_multi_year_engine(_source_key(ADMISSION_FILES, "113"), _source_key(ADMISSION_FILES, "112"))
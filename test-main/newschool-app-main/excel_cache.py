@@ -0,0 +1,100 @@
+"""Excel 工作表的欄式（Parquet）快取。
+
+第一次讀取某個工作表時，用 pd.read_excel 解析後轉存成 Parquet；
+之後只要原始檔沒有變動，就直接從 Parquet 載入，不再經過 openpyxl。
+快取鍵為「絕對路徑 + 工作表 + mtime + 內容雜湊」，原始 Excel 一旦更新就會自動重建。
+內容雜湊在同一個行程內依 (路徑, mtime, 檔案大小) 記住，檔案沒變時查快取鍵只需一次 stat。
+"""
+import hashlib
+import logging
+import os
+import threading
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 快取檔放在程式目錄下，與執行時的工作目錄無關
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".excel_cache")
+
+_lock = threading.Lock()
+
+# 絕對路徑 → ((mtime_ns, 檔案大小), 內容雜湊)
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """計算檔案內容的 SHA-256。"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _memoized_digest(path, stat):
+    # stat 結果沒變就沿用上次的內容雜湊，不重新讀取整個檔案
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _digests_lock:
+        cached = _digests.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    digest = file_digest(path)
+    with _digests_lock:
+        _digests[path] = (version, digest)
+    return digest
+
+
+def _cache_prefix(path, sheet_name):
+    # 同一個檔案/工作表的所有快取版本共用前綴，方便清掉舊版本
+    return hashlib.sha1(f"{path}|{sheet_name}".encode("utf-8")).hexdigest()[:16]
+
+
+def cache_path(path, sheet_name=0):
+    """回傳目前原始檔內容所對應的快取檔路徑（不保證已存在）。"""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = hashlib.sha1(f"{path}|{sheet_name}|{stat.st_mtime_ns}|{_memoized_digest(path, stat)}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f"{_cache_prefix(path, sheet_name)}-{key}.parquet")
+
+
+def _normalize_for_parquet(df):
+    # Excel 欄位常混有數字與 '--' 之類的字串，Parquet 需要單一型別，統一轉成字串（保留缺值）
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True) not in ("string", "empty"):
+            df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v))
+    return df
+
+
+def _remove_stale(prefix, keep):
+    for name in os.listdir(CACHE_DIR):
+        if name.startswith(prefix + "-") and name != keep:
+            try:
+                os.remove(os.path.join(CACHE_DIR, name))
+            except OSError:
+                pass
+
+
+def read_excel_cached(path, sheet_name=0):
+    """與 pd.read_excel(path, sheet_name=...) 相同，但優先從 Parquet 快取讀取。"""
+    target = cache_path(path, sheet_name)
+    if os.path.exists(target):
+        try:
+            return pd.read_parquet(target)
+        except Exception as e:
+            logger.warning("快取檔 %s 損毀，重新建立：%s", target, e)
+
+    df = _normalize_for_parquet(pd.read_excel(path, sheet_name=sheet_name))
+    with _lock:
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+            df.to_parquet(tmp, index=False)
+            os.replace(tmp, target)
+            _remove_stale(os.path.basename(target).split("-")[0], os.path.basename(target))
+        except Exception as e:
+            # 快取只是加速用，寫不進去時仍回傳剛讀到的資料
+            logger.warning("無法寫入快取 %s：%s", target, e)
+    return df
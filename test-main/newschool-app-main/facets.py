@@ -0,0 +1,40 @@
+"""校系資料的布林屬性（facet）欄位。
+
+學校類型等屬性在資料載入時就算成布林欄位（見 datasets.py、multi_year.py），
+頁面篩選時以 facet_mask 把各條件的布林陣列做向量化 AND/OR，不必逐列比對學校名稱字串：
+
+- 「公立」：學校名稱以「國立」開頭（每個學年度的校系資料表都有）。
+- 「有112資料」：今年度的校系在去年度也有資料（multi_year 的 departments 表）。
+- 學年度：multi_year 的 stacked 表以「年度」欄區分。
+"""
+import numpy as np
+
+# 學校名稱以此開頭者視為公立
+PUBLIC_PREFIX = '國立'
+
+# 頁面上的學校類型選項
+SCHOOL_TYPES = ['全部', '公立', '私立']
+
+
+def add_school_facets(df):
+    """加上「公立」布林欄位（原地修改並回傳 df）。"""
+    df['公立'] = df['學校名稱'].str.startswith(PUBLIC_PREFIX, na=False).to_numpy(dtype=bool)
+    return df
+
+
+def facet_mask(df, school_type='全部', years=None, flags=()):
+    """組合各條件的布林遮罩（各條件之間為 AND）。
+
+    school_type 為 SCHOOL_TYPES 之一；years 為要保留的學年度（符合任一個即可，需有「年度」欄）；
+    flags 為必須為 True 的布林欄位名稱（如「有112資料」）。
+    """
+    mask = np.ones(len(df), dtype=bool)
+    if school_type == '公立':
+        mask &= df['公立'].to_numpy(dtype=bool)
+    elif school_type == '私立':
+        mask &= ~df['公立'].to_numpy(dtype=bool)
+    if years is not None:
+        mask &= df['年度'].isin([str(year) for year in years]).to_numpy(dtype=bool)
+    for flag in flags:
+        mask &= df[flag].to_numpy(dtype=bool)
+    return mask
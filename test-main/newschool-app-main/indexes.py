@@ -0,0 +1,124 @@
+"""校系資料的查詢索引。
+
+索引在資料載入時建立一次（見 datasets.py），頁面以索引做點查詢或範圍查詢，
+不必每次都對整張表做布林篩選。索引回傳的都是「列位置」，搭配 df.iloc 取資料。
+"""
+import numpy as np
+
+from scoring import SUBJECT_INDEX, WEIGHT_COLUMNS
+
+
+class DepartmentIndex:
+    """(學校名稱, 系科組學程名稱, 學年度) → 列位置 的雜湊索引。
+
+    若資料表有「年度」欄位就以該欄為學年度，否則整張表都屬於建立時指定的 year。
+    同一個鍵出現多次時只記第一筆，與原本 boolean mask 後取 .iloc[0] 的行為一致。
+    """
+
+    def __init__(self, df, year=None):
+        schools = df['學校名稱'].to_numpy(dtype=object)
+        depts = df['系科組學程名稱'].to_numpy(dtype=object)
+        if '年度' in df.columns:
+            years = df['年度'].astype(str).to_numpy(dtype=object)
+        else:
+            years = np.full(len(df), str(year), dtype=object)
+        self.year = None if year is None else str(year)
+
+        positions = {}
+        for pos, key in enumerate(zip(schools, depts, years)):
+            positions.setdefault(key, pos)
+        self._positions = positions
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _year(self, year):
+        return self.year if year is None else str(year)
+
+    def get(self, school, dept, year=None, default=-1):
+        """查詢單一校系的列位置，找不到時回傳 default。"""
+        return self._positions.get((school, dept, self._year(year)), default)
+
+    def lookup(self, schools, depts, year=None):
+        """批次查詢，回傳列位置陣列（找不到為 -1）。"""
+        year = self._year(year)
+        get = self._positions.get
+        return np.fromiter((get((school, dept, year), -1) for school, dept in zip(schools, depts)),
+                           dtype=np.int64, count=len(schools))
+
+
+class ScoreIndex:
+    """依某個分數欄位（如「平均」、「錄取總分數」）預先排序的索引，缺值不收錄。
+
+    範圍查詢與最近鄰查詢都以二分搜尋（searchsorted）定位，
+    時間複雜度為 O(log n + 結果筆數)，不必掃描整張表。
+    """
+
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=float)
+        valid = np.flatnonzero(~np.isnan(self.values))
+        self.positions = valid[np.argsort(self.values[valid], kind='stable')]
+        self.sorted_values = self.values[self.positions]
+
+    def __len__(self):
+        return len(self.positions)
+
+    def between(self, low, high):
+        """回傳分數介於 [low, high] 的列位置，依分數由低到高排序。"""
+        start = np.searchsorted(self.sorted_values, low, side='left')
+        stop = np.searchsorted(self.sorted_values, high, side='right')
+        return self.positions[start:stop]
+
+    def window(self, center, radius):
+        """回傳分數介於 center ± radius 的列位置，依與 center 的差距由近到遠排序。"""
+        start = np.searchsorted(self.sorted_values, center - radius, side='left')
+        stop = np.searchsorted(self.sorted_values, center + radius, side='right')
+        order = np.argsort(np.abs(self.sorted_values[start:stop] - center), kind='stable')
+        return self.positions[start:stop][order]
+
+    def nearest(self, center, k, radius=None):
+        """回傳分數最接近 center 的 k 個列位置（可限制差距不超過 radius），依差距由近到遠排序。"""
+        # 最近的 k 筆一定落在插入點左右各 k 筆之內
+        insert_at = np.searchsorted(self.sorted_values, center)
+        start = max(insert_at - k, 0)
+        stop = min(insert_at + k, len(self.sorted_values))
+        distances = np.abs(self.sorted_values[start:stop] - center)
+        order = np.argsort(distances, kind='stable')[:k]
+        if radius is not None:
+            order = order[distances[order] <= radius]
+        return self.positions[start:stop][order]
+
+
+class SubjectWeightIndex:
+    """各科加權的排序索引：每一科一個依該科加權排序的 ScoreIndex，以科目名稱（SUBJECTS）查詢。
+
+    每一列另外記下它在該科排序中的名次（缺值排在最後），「某些校系中某科加權最低的校系」
+    只要取這些列位置名次的最小值，時間與查詢的列數成正比，與整張表的大小無關。
+    """
+
+    def __init__(self, df):
+        # 保留各欄原本的型態（例如整數加權），回傳的加權值與資料表中的顯示方式相同
+        self.weights = {subject: df[WEIGHT_COLUMNS[i]].to_numpy() for subject, i in SUBJECT_INDEX.items()}
+        self._indexes = {subject: ScoreIndex(weights) for subject, weights in self.weights.items()}
+        self._ranks = {}
+        for subject, index in self._indexes.items():
+            rank = np.full(len(index.values), len(index), dtype=np.int64)
+            rank[index.positions] = np.arange(len(index))
+            self._ranks[subject] = rank
+
+    def __getitem__(self, subject):
+        """subject 科加權的 ScoreIndex。"""
+        return self._indexes[subject]
+
+    def lowest(self, subject, positions):
+        """回傳 (positions 中 subject 科加權最低的列位置, 該加權)，列位置維持 positions 的順序。
+
+        positions 中沒有任何有效加權時回傳 (空陣列, None)。
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        index = self._indexes[subject]
+        best = self._ranks[subject][positions].min(initial=len(index))
+        if best == len(index):
+            return positions[:0], None
+        first = index.positions[best]
+        return positions[index.values[positions] == index.values[first]], self.weights[subject][first]
@@ -0,0 +1,94 @@
+"""LLM 回覆的磁碟快取（SQLite）。
+
+以「正規化後的 prompt + 模型 + max_tokens」為鍵保存回覆，熱門校系的重複查詢
+直接從本機回傳，不必再呼叫 API。每筆資料有存活時間（TTL），
+超過筆數上限時依最後存取時間淘汰最久沒用到的資料（LRU）。
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".llm_cache.sqlite3")
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 5000
+
+
+def normalize_prompt(prompt):
+    """統一全形/半形字元並合併連續空白，讓只差在空白或全半形的 prompt 共用快取。"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", prompt)).strip()
+
+
+def cache_key(prompt, model, max_tokens):
+    raw = f"{model}\x00{max_tokens}\x00{normalize_prompt(prompt)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """以 SQLite 保存的 TTL + LRU 快取，可在多個執行緒間共用。"""
+
+    def __init__(self, path=DEFAULT_PATH, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    def _connect(self):
+        # sqlite3 連線不能跨執行緒使用，每個執行緒各自保留一條
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, allow_expired=False):
+        """回傳快取的回覆；不存在或已過期時回傳 None。
+
+        過期的資料不會立即刪除（由 purge_expired 與筆數上限清除），
+        allow_expired=True 時仍會回傳，供上游逾時時當作備用答案。
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds and not allow_expired:
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key, response):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            # 超過上限時淘汰最久沒被讀取的資料
+            conn.execute("""
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def purge_expired(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
@@ -0,0 +1,322 @@
+"""呼叫 OpenAI 聊天模型（openai 0.28 的 ChatCompletion）。
+
+回覆會先查 llm_cache 的磁碟快取，快取沒有才真正呼叫 API。
+快取設定可用環境變數調整：LLM_CACHE_PATH、LLM_CACHE_TTL（秒）、LLM_CACHE_MAX_ENTRIES。
+
+同一個行程內，相同 prompt 同時只會有一個上游請求（single-flight），
+其他 session 直接共用這個請求串流回來的文字；同時進行的上游請求數量
+以 LLM_MAX_CONCURRENCY（預設 4）限制，避免大量使用者同時開啟時耗盡速率限制。
+每個上游請求（含串流讀取）最多 LLM_REQUEST_TIMEOUT 秒（預設 30 秒，應大於頁面的時間預算），
+上游沒有回應時逾時失敗並釋放名額，不會永久佔住併發上限。
+
+stream_chat_completion 會邊收邊回傳文字片段，並記錄首個字元延遲（TTFT）與總延遲。
+頁面上的呼叫有時間預算（LLM_DEADLINE_SECONDS，預設 8 秒）：超過預算時改回傳
+該 prompt 先前（可能已過期）的快取答案或呼叫端提供的備用內容，上游請求則繼續
+在背景完成並寫入快取，之後再顯示即為即時答案。
+
+pregenerate.py 預先產生的回覆（LLM_PREGENERATED_PATH，預設 llm_pregenerated.json.gz）
+在第一次查詢時載入，命中的 prompt 不需查快取也不會呼叫 API。
+"""
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import NamedTuple
+
+import openai
+
+from llm_cache import DEFAULT_MAX_ENTRIES, DEFAULT_PATH, DEFAULT_TTL_SECONDS, LLMCache, cache_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+DEFAULT_MAX_TOKENS = 500
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", 8))
+DEFAULT_REQUEST_TIMEOUT = 30
+DEFAULT_PREGENERATED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_pregenerated.json.gz")
+
+# 逾時且沒有任何備用內容時顯示的訊息
+UNAVAILABLE_MESSAGE = "AI 回覆暫時無法取得，請稍後再試。"
+# 回覆已開始顯示但沒有在時間內完成時，附加在後面的提示
+INCOMPLETE_NOTICE = "\n\n……（回覆時間過長，完整內容產生後會自動補上）"
+INTERRUPTED_NOTICE = "\n\n……（回覆中斷，請稍後再試）"
+
+
+class CallTiming(NamedTuple):
+    """一次 LLM 呼叫的延遲紀錄（秒）。"""
+    key: str
+    cached: bool
+    time_to_first_token: float
+    total: float
+    timed_out: bool = False
+
+
+# 最近的呼叫延遲，供監控或除錯查看
+recent_timings = deque(maxlen=200)
+
+_cache = None
+_cache_lock = threading.Lock()
+_pregenerated = None
+
+# 上游後端，None 表示使用 openai.ChatCompletion（離線測試可換成 llm_fake.FakeChatCompletion）
+_backend = None
+_limiter = threading.BoundedSemaphore(int(os.getenv("LLM_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)))
+_request_timeout = float(os.getenv("LLM_REQUEST_TIMEOUT", DEFAULT_REQUEST_TIMEOUT))
+
+# 進行中的上游請求：快取鍵 → _Flight
+_flights = {}
+_flights_lock = threading.Lock()
+
+# 最近失敗的上游請求：快取鍵 → 例外（同一個 prompt 之後成功時移除），最多保留 _MAX_FAILURES 筆
+_failures = OrderedDict()
+_MAX_FAILURES = 200
+
+
+def get_cache():
+    """整個行程共用一個 LLMCache。"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(
+                path=os.getenv("LLM_CACHE_PATH", DEFAULT_PATH),
+                ttl_seconds=float(os.getenv("LLM_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+                max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            )
+        return _cache
+
+
+def load_pregenerated(path):
+    """讀取 pregenerate.py 產生的檔案，回傳 快取鍵 → 回覆；檔案不存在時回傳空 dict。"""
+    if not os.path.exists(path):
+        return {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        responses = json.load(f)["responses"]
+    logger.info("已載入 %d 筆預先產生的 LLM 回覆：%s", len(responses), path)
+    return responses
+
+
+def get_pregenerated():
+    """整個行程共用一份預先產生的回覆。"""
+    global _pregenerated
+    with _cache_lock:
+        if _pregenerated is None:
+            _pregenerated = load_pregenerated(os.getenv("LLM_PREGENERATED_PATH", DEFAULT_PREGENERATED_PATH))
+        return _pregenerated
+
+
+def set_backend(backend):
+    """替換上游後端（需提供與 openai.ChatCompletion.create 相同的 create()）；傳 None 還原。"""
+    global _backend
+    _backend = backend
+
+
+def set_max_concurrency(limit):
+    """調整同時進行的上游請求上限（只影響之後開始的請求）。"""
+    global _limiter
+    _limiter = threading.BoundedSemaphore(limit)
+
+
+def set_request_timeout(seconds):
+    """調整每個上游請求（含串流讀取）的秒數上限（只影響之後開始的請求）。"""
+    global _request_timeout
+    _request_timeout = seconds
+
+
+class _Flight:
+    """一個進行中的上游請求；文字片段累積在 parts，所有等待者各自依序讀取。"""
+
+    def __init__(self, key):
+        self.key = key
+        self.parts = []
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+
+    def _append(self, text):
+        with self.cond:
+            self.parts.append(text)
+            self.cond.notify_all()
+
+    def _finish(self, error=None):
+        with self.cond:
+            self.error = error
+            self.done = True
+            self.cond.notify_all()
+
+    def subscribe(self, deadline=None):
+        """依序產生已收到與之後收到的文字片段，請求失敗時拋出原本的例外。
+
+        deadline 為 time.monotonic() 的截止時間，過了仍未完成時拋出 TimeoutError（請求本身不受影響）。
+        """
+        index = 0
+        while True:
+            with self.cond:
+                if index == len(self.parts) and not self.done:
+                    timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                    if not self.cond.wait_for(lambda: index < len(self.parts) or self.done, timeout):
+                        raise TimeoutError(self.key)
+                new_parts = self.parts[index:]
+                done, error = self.done, self.error
+            index += len(new_parts)
+            yield from new_parts
+            if done and index == len(self.parts):
+                if error is not None:
+                    raise error
+                return
+
+
+def request_completion(prompt, model=DEFAULT_MODEL, max_tokens=DEFAULT_MAX_TOKENS):
+    """直接向上游要一次完整回覆（受併發上限限制，不經過快取與預先產生的回覆）。"""
+    with _limiter:
+        backend = _backend or openai.ChatCompletion
+        response = backend.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            request_timeout=_request_timeout
+        )
+    content = response["choices"][0]["message"]["content"]
+    if not content:
+        raise ValueError("LLM 回覆沒有內容")
+    return content
+
+
+def _read_stream(flight, response, deadline):
+    # request_timeout 只限制每次等待上游的時間，整個請求另外以 deadline（time.monotonic()）為上限
+    try:
+        for chunk in response:
+            text = chunk["choices"][0]["delta"].get("content")
+            if text:
+                flight._append(text)
+            if time.monotonic() > deadline:
+                raise TimeoutError(flight.key)
+    finally:
+        close = getattr(response, "close", None)
+        if close is not None:
+            close()
+
+
+def _run_flight(flight, prompt, model, max_tokens):
+    error = None
+    try:
+        with _limiter:
+            timeout = _request_timeout
+            deadline = time.monotonic() + timeout
+            backend = _backend or openai.ChatCompletion
+            response = backend.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                stream=True,
+                request_timeout=timeout
+            )
+            _read_stream(flight, response, deadline)
+        # 沒有任何文字（例如被內容過濾）視為失敗，不寫入快取，頁面改顯示備用內容
+        text = "".join(flight.parts)
+        if not text:
+            raise ValueError("LLM 回覆沒有內容")
+        get_cache().set(flight.key, text)
+    except Exception as e:
+        logger.warning("LLM 請求失敗：%s", e)
+        error = e
+    finally:
+        with _flights_lock:
+            _flights.pop(flight.key, None)
+            # 記下這次請求的結果，頁面輪詢時才能分辨「已失敗」與「還在產生」
+            if error is None:
+                _failures.pop(flight.key, None)
+            else:
+                _failures[flight.key] = error
+                _failures.move_to_end(flight.key)
+                while len(_failures) > _MAX_FAILURES:
+                    _failures.popitem(last=False)
+    flight._finish(error)
+
+
+def _get_or_start(prompt, model, max_tokens):
+    """回傳 (快取的回覆, None) 或 (None, 進行中的請求)；相同鍵的請求只會啟動一次。"""
+    key = cache_key(prompt, model, max_tokens)
+    pregenerated = get_pregenerated().get(key)
+    if pregenerated:
+        return pregenerated, None
+    with _flights_lock:
+        flight = _flights.get(key)
+        if flight is None:
+            # 在鎖內查快取，避免剛完成的請求已移出 _flights 卻被當成未命中；空字串視為未命中
+            cached = get_cache().get(key)
+            if cached:
+                return cached, None
+            flight = _flights[key] = _Flight(key)
+            threading.Thread(target=_run_flight, args=(flight, prompt, model, max_tokens),
+                             name=f"llm-{key[:8]}", daemon=True).start()
+    return None, flight
+
+
+def _record_timing(key, cached, started, first_token_at, timed_out=False):
+    now = time.perf_counter()
+    timing = CallTiming(key, cached, (first_token_at or now) - started, now - started, timed_out)
+    recent_timings.append(timing)
+    logger.info("LLM %s：首字 %.3fs，總計 %.3fs", "逾時" if timed_out else "快取" if cached else "呼叫",
+                timing.time_to_first_token, timing.total)
+    return timing
+
+
+def stream_chat_completion(prompt, model=DEFAULT_MODEL, max_tokens=DEFAULT_MAX_TOKENS,
+                           deadline=DEFAULT_DEADLINE_SECONDS, fallback=None):
+    """逐段產生模型的回覆文字（可直接交給 st.write_stream），完整回覆會寫入快取。
+
+    deadline 為整個回覆的秒數預算（None 表示不限）。超過預算或上游失敗時：尚未顯示任何文字
+    就改回傳先前的快取答案、fallback 或 UNAVAILABLE_MESSAGE；已顯示部分文字則附上提示。
+    不限時間預算時，上游失敗會直接拋出例外。
+    """
+    started = time.perf_counter()
+    key = cache_key(prompt, model, max_tokens)
+    cached, flight = _get_or_start(prompt, model, max_tokens)
+    if cached is not None:
+        _record_timing(key, True, started, time.perf_counter())
+        yield cached
+        return
+
+    first_token_at = None
+    try:
+        for text in flight.subscribe(None if deadline is None else time.monotonic() + deadline):
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            yield text
+    except Exception as e:
+        if deadline is None:
+            raise
+        _record_timing(key, False, started, first_token_at, timed_out=True)
+        if first_token_at is not None:
+            yield INCOMPLETE_NOTICE if isinstance(e, TimeoutError) else INTERRUPTED_NOTICE
+        else:
+            yield get_cache().get(key, allow_expired=True) or fallback or UNAVAILABLE_MESSAGE
+        return
+    _record_timing(key, False, started, first_token_at)
+
+
+def chat_completion(prompt, model=DEFAULT_MODEL, max_tokens=DEFAULT_MAX_TOKENS):
+    """回傳模型對 prompt 的完整回覆文字（不設時間預算），相同的 prompt/模型/max_tokens 會直接使用快取。"""
+    return "".join(stream_chat_completion(prompt, model, max_tokens, deadline=None))
+
+
+def pending(prompt, model=DEFAULT_MODEL, max_tokens=DEFAULT_MAX_TOKENS):
+    """prompt 是否還有進行中的上游請求。"""
+    with _flights_lock:
+        return cache_key(prompt, model, max_tokens) in _flights
+
+
+def last_error(prompt, model=DEFAULT_MODEL, max_tokens=DEFAULT_MAX_TOKENS):
+    """prompt 最近一次上游請求失敗時的例外；沒有失敗紀錄（或之後已成功）時回傳 None。"""
+    with _flights_lock:
+        return _failures.get(cache_key(prompt, model, max_tokens))
+
+
+def cached_response(prompt, model=DEFAULT_MODEL, max_tokens=DEFAULT_MAX_TOKENS):
+    """回傳預先產生或未過期的快取答案，沒有時回傳 None（不會呼叫 API）。"""
+    key = cache_key(prompt, model, max_tokens)
+    return get_pregenerated().get(key) or get_cache().get(key)
@@ -0,0 +1,107 @@
+"""離線用的假 LLM 後端與壓力測試。
+
+FakeChatCompletion 模擬 openai.ChatCompletion.create 的串流回覆（可設定延遲），
+並記錄呼叫次數與最大同時請求數，用來驗證 llm_client 的 single-flight 與併發上限：
+
+    python llm_fake.py --sessions 60 --prompts 5 --concurrency 4
+"""
+import argparse
+import tempfile
+import threading
+import time
+from collections import Counter
+
+
+class FakeChatCompletion:
+    """回覆固定文字的假後端，介面與 openai.ChatCompletion 相同（只支援 create）。"""
+
+    def __init__(self, latency=0.5, token_interval=0.01, reply="這是離線測試用的回覆。"):
+        self.latency = latency
+        self.token_interval = token_interval
+        self.reply = reply
+        self.calls = Counter()
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def create(self, model, messages, max_tokens=None, stream=False, **kwargs):
+        prompt = messages[-1]["content"]
+        with self._lock:
+            self.calls[prompt] += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.latency)
+            tokens = [f"{prompt}：", *self.reply]
+        except BaseException:
+            self._release()
+            raise
+        if not stream:
+            self._release()
+            return {"choices": [{"message": {"role": "assistant", "content": "".join(tokens)}}]}
+        return self._stream(tokens)
+
+    def _stream(self, tokens):
+        try:
+            for token in tokens:
+                time.sleep(self.token_interval)
+                yield {"choices": [{"delta": {"content": token}}]}
+        finally:
+            self._release()
+
+    def _release(self):
+        with self._lock:
+            self.active -= 1
+
+
+def run_load_test(sessions, prompts, concurrency, latency):
+    """模擬 sessions 個使用者同時詢問 prompts 種不同的 prompt，回傳統計結果。"""
+    import llm_client
+    from llm_cache import LLMCache
+
+    backend = FakeChatCompletion(latency=latency)
+    llm_client.set_backend(backend)
+    llm_client.set_max_concurrency(concurrency)
+    with tempfile.TemporaryDirectory() as tmp:
+        llm_client._cache = LLMCache(path=f"{tmp}/cache.sqlite3")
+        replies = [None] * sessions
+        barrier = threading.Barrier(sessions)
+
+        def session(i):
+            barrier.wait()
+            replies[i] = llm_client.chat_completion(f"使用者錄取了 學校{i % prompts} 的 科系")
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        llm_client._cache = None
+    llm_client.set_backend(None)
+
+    return {
+        "sessions": sessions,
+        "upstream_calls": sum(backend.calls.values()),
+        "max_concurrent_calls": backend.max_active,
+        "elapsed": elapsed,
+        "all_answered": all(replies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以假後端測試 LLM 請求合併與併發上限")
+    parser.add_argument("--sessions", type=int, default=60)
+    parser.add_argument("--prompts", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+    stats = run_load_test(args.sessions, args.prompts, args.concurrency, args.latency)
+    print(f"{stats['sessions']} 個 session，上游請求 {stats['upstream_calls']} 次，"
+          f"最多同時 {stats['max_concurrent_calls']} 個，耗時 {stats['elapsed']:.2f} 秒，"
+          f"{'全部取得回覆' if stats['all_answered'] else '有 session 未取得回覆'}")
+
+
+if __name__ == "__main__":
+    main()
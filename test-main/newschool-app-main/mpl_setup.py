@@ -0,0 +1,39 @@
+"""matplotlib 的字型與繪圖設定，每個行程只做一次。
+
+中文字型檔以程式目錄為準（不受啟動時的工作目錄影響），找不到時立即拋出錯誤，
+不會等到畫圖時才出現缺字的方塊。charts 模組載入時會呼叫 init_matplotlib()。
+"""
+import os
+import threading
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.font_manager as fm
+import matplotlib.pyplot as plt
+
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "TaipeiSansTCBeta-Regular.ttf")
+FONT_FAMILY = "Taipei Sans TC Beta"
+
+_initialized = False
+_lock = threading.Lock()
+
+
+def init_matplotlib(font_path=FONT_PATH):
+    """註冊中文字型並設定 rcParams；重複呼叫不會重做。字型檔不存在時拋出 FileNotFoundError。"""
+    global _initialized
+    with _lock:
+        if _initialized:
+            return
+        if not os.path.isfile(font_path):
+            raise FileNotFoundError(f"找不到中文字型檔：{font_path}（請將 TaipeiSansTCBeta-Regular.ttf 放在程式目錄）")
+
+        fm.fontManager.addfont(font_path)
+        plt.rc('font', family=FONT_FAMILY)
+        plt.rcParams['font.sans-serif'] = ['Microsoft JhengHei', 'Arial']
+        plt.rcParams['axes.unicode_minus'] = False
+
+        # 先查一次字型，之後畫圖直接使用 font_manager 的查詢快取
+        fm.findfont(fm.FontProperties(family=FONT_FAMILY))
+        _initialized = True
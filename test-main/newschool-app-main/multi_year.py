@@ -0,0 +1,80 @@
+"""112/113 兩個學年度合併後的校系資料。
+
+在資料載入時建立一次（見 datasets.get_multi_year_tables），各頁面直接讀取，不必每次重新合併：
+
+- stacked：兩年度資料上下相接並加上「年度」欄（首頁選「全部」時使用），
+  offsets 為各年度在 stacked 中的起始列位置。
+- departments：今年度每個校系一列，列位置與今年度資料表相同（可直接用今年度的
+  DepartmentIndex / ScoreIndex 查詢）。今年度欄位維持原名，去年度欄位加上「_112」後綴
+  （去年度沒有的校系為空值），另有年度間的變化、兩年度的錄取總分數排名，
+  以及去年度是否有該校系的布林欄位「有112資料」（見 facets.py）。
+- schools：每校一列，以各校最高錄取總分數作為分數線，含兩年度排名與變化。
+"""
+from typing import NamedTuple
+
+import pandas as pd
+
+DEPARTMENT_KEY = ['學校名稱', '系科組學程名稱']
+
+# departments 表中保留的去年度欄位
+PREVIOUS_COLUMNS = ['平均', '錄取總分數', '招生名額', '錄取人數']
+
+
+class MultiYearTables(NamedTuple):
+    stacked: pd.DataFrame
+    offsets: dict
+    departments: pd.DataFrame
+    schools: pd.DataFrame
+
+    def copy(self):
+        """各表的淺層複本（共用底層資料，頁面新增欄位不影響共用的原表）。"""
+        return self._replace(stacked=self.stacked.copy(deep=False),
+                             offsets=dict(self.offsets),
+                             departments=self.departments.copy(deep=False),
+                             schools=self.schools.copy(deep=False))
+
+
+def _stack(latest, previous, latest_year, previous_year):
+    stacked = pd.concat([latest.assign(年度=latest_year), previous.assign(年度=previous_year)], ignore_index=True)
+    return stacked, {latest_year: 0, previous_year: len(latest)}
+
+
+def _departments(latest, previous, previous_year):
+    suffix = f"_{previous_year}"
+    # 排名在各年度完整的資料表內計算，再合併進來
+    previous = previous[DEPARTMENT_KEY + PREVIOUS_COLUMNS].drop_duplicates(DEPARTMENT_KEY)
+    previous['錄取總分數排名'] = previous['錄取總分數'].rank(ascending=False, method='min')
+    previous = previous.rename(columns={col: col + suffix for col in previous.columns if col not in DEPARTMENT_KEY})
+    # 左合併且鍵唯一：列順序與今年度資料表相同
+    has_previous = f'有{previous_year}資料'
+    departments = pd.merge(latest, previous, on=DEPARTMENT_KEY, how='left', indicator=has_previous)
+    departments[has_previous] = (departments[has_previous] == 'both').to_numpy(dtype=bool)
+
+    departments['平均變化'] = departments['平均'] - departments['平均' + suffix]
+    departments['錄取總分數變化'] = departments['錄取總分數'] - departments['錄取總分數' + suffix]
+    departments['錄取總分數排名'] = departments['錄取總分數'].rank(ascending=False, method='min')
+    return departments
+
+
+def _schools(latest, previous, latest_year, previous_year):
+    # 取每校最高分數線（有些學校可能有多科系，這裡以最高分為代表）
+    latest_line, previous_line = f'{latest_year}分數線', f'{previous_year}分數線'
+    school_latest = latest.groupby('學校名稱')['錄取總分數'].max().reset_index().rename(columns={'錄取總分數': latest_line})
+    school_previous = previous.groupby('學校名稱')['錄取總分數'].max().reset_index().rename(columns={'錄取總分數': previous_line})
+
+    schools = pd.merge(school_latest, school_previous, on='學校名稱', how='outer')
+    schools['分數線變化'] = schools[latest_line] - schools[previous_line]
+    schools[f'{latest_year}排名'] = schools[latest_line].rank(ascending=False, method='min')
+    schools[f'{previous_year}排名'] = schools[previous_line].rank(ascending=False, method='min')
+    return schools.sort_values(f'{latest_year}排名')
+
+
+def build_multi_year_tables(latest, previous, latest_year="113", previous_year="112"):
+    """由今年度與去年度的校系資料建立 MultiYearTables。"""
+    stacked, offsets = _stack(latest, previous, latest_year, previous_year)
+    return MultiYearTables(
+        stacked=stacked,
+        offsets=offsets,
+        departments=_departments(latest, previous, previous_year),
+        schools=_schools(latest, previous, latest_year, previous_year),
+    )
@@ -1,5 +1,9 @@
 import streamlit as st
 import pandas as pd
+from datasets import (get_admission_table, get_department_index, get_multi_year_engine, get_multi_year_tables,
+                      get_score_index, get_subject_weight_index)
+from facets import SCHOOL_TYPES, facet_mask
+from result_tables import build_department_table, style_department_table
 
 # 設定頁面配置
 st.set_page_config(
@@ -147,25 +151,100 @@ st.markdown("""
 
 # 讀取資料
 try:
-    df_113 = pd.read_excel("11309a (1).xlsx", sheet_name="Sheet1")
-    df_113['錄取總分數(沒加權)'] = pd.to_numeric(df_113['錄取總分數(沒加權)'], errors='coerce')
-    df_113['平均'] = pd.to_numeric(df_113['平均'], errors='coerce')
+    df_113 = get_admission_table("113")
     
-    # 讀取 112 學年資料
-    df_112 = pd.read_excel("11209.xlsx", sheet_name="工作表1")
-    df_112['平均'] = pd.to_numeric(df_112['平均'], errors='coerce')
+    # 113 學年 (學校, 科系) → 列位置 索引
+    department_index = get_department_index("113")
+
+    # 113 學年各科加權的排序索引
+    subject_weight_index = get_subject_weight_index("113")
     
-    # 合併 112 和 113 的資料
-    df_merged = pd.merge(df_113, df_112[['學校名稱', '系科組學程名稱', '平均']], 
-                        on=['學校名稱', '系科組學程名稱'], 
-                        how='left', 
-                        suffixes=('', '_112'))
+    # 112 和 113 合併後的校系表（載入時建立一次；前面的列位置與 df_113 相同，可直接用 department_index 查詢）
+    df_merged = get_multi_year_tables().departments
     
     st.sidebar.success("✅ 成功載入 112 和 113 學年度資料")
 except Exception as e:
     st.sidebar.error(f"❌ 無法載入資料: {str(e)}")
     df_113 = pd.DataFrame()
 
+# 學校類型、學校與科系的選擇只影響下方的詳細資訊卡片，
+# 以 fragment 隔開：切換選項時只重跑這個區塊，不重算上方的相近校系表格
+@st.fragment
+def school_detail_section(similar_df, df_merged, department_index):
+    # 添加學校類型選擇
+    st.markdown("#### 🏫 依學校類型篩選")
+    school_type = st.radio("學校類型：", SCHOOL_TYPES, 
+                         horizontal=True, 
+                         key="school_type_radio",
+                         index=SCHOOL_TYPES.index(st.session_state.school_type))
+    
+    # 更新 session state
+    st.session_state.school_type = school_type
+    
+    # 根據學校類型篩選學校（以載入時建立的「公立」布林欄位篩選）
+    similar_df = similar_df[facet_mask(similar_df, school_type)]
+    
+    # 添加學校和科系選擇
+    st.markdown("#### 🎓 選擇特定學校與科系")
+    col1, col2 = st.columns(2)
+    with col1:
+        # 從表格中獲取學校列表
+        available_schools = similar_df["學校名稱"].unique()
+        similar_school = st.selectbox("選擇學校", 
+                                    available_schools, 
+                                    key="similar_school_select",
+                                    index=0 if st.session_state.similar_school not in available_schools else 
+                                          list(available_schools).index(st.session_state.similar_school))
+    
+    # 更新 session state
+    st.session_state.similar_school = similar_school
+    
+    with col2:
+        # 根據選中的學校篩選科系
+        filtered_dept = similar_df[similar_df["學校名稱"] == similar_school]
+        available_depts = filtered_dept["系科組學程名稱"].unique()
+        
+        # 如果之前選擇的科系不在當前學校的科系列表中，重置為第一個選項
+        if st.session_state.similar_dept not in available_depts:
+            st.session_state.similar_dept = available_depts[0] if len(available_depts) > 0 else None
+        
+        similar_dept = st.selectbox("選擇科系", 
+                                  available_depts, 
+                                  key="similar_dept_select",
+                                  index=0 if st.session_state.similar_dept is None else 
+                                        list(available_depts).index(st.session_state.similar_dept))
+    
+    # 更新 session state
+    st.session_state.similar_dept = similar_dept
+    
+    # 顯示選中的學校和科系的詳細資訊
+    selected_row = df_merged.iloc[department_index.get(similar_school, similar_dept)]
+    
+    st.markdown("#### 📌 選中的學校與科系資訊")
+    with st.container():
+        st.markdown('<div class="card">', unsafe_allow_html=True)
+        st.write(f"**學校名稱**: {selected_row['學校名稱']}")
+        st.write(f"**科系名稱**: {selected_row['系科組學程名稱']}")
+        st.write(f"**平均分數**: {selected_row['平均']:.2f} 分")
+        st.write(f"**加權公式**: 國文 × {selected_row['國文加權']} + 英文 × {selected_row[' 英文加權']} + 數學 × {selected_row[' 數學加權']} + 專業(一) × {selected_row[' 專業(一)加權']} + 專業(二) × {selected_row[' 專業(二)加權']}")
+        st.markdown('</div>', unsafe_allow_html=True)
+    
+    # 使用該學校加權的成績（已由 ScoringEngine 算好）
+    selected_weighted_total = selected_row['加權總分']
+    
+    st.markdown("#### 📊 使用該學校加權的成績計算")
+    with st.container():
+        st.markdown('<div class="card">', unsafe_allow_html=True)
+        st.write(f"**加權總分**: {selected_weighted_total:.2f} 分")
+        st.write(f"**平均分數**: {selected_row['平均']:.2f} 分")
+        
+        if selected_weighted_total >= selected_row['錄取總分數(沒加權)']:
+            st.success(f"✅ 您的加權總分 ({selected_weighted_total:.2f}) 達到或超過錄取總分 ({selected_row['錄取總分數(沒加權)']:.2f})！")
+        else:
+            st.warning(f"❌ 您的加權總分 ({selected_weighted_total:.2f}) 低於錄取總分 ({selected_row['錄取總分數(沒加權)']:.2f})，差 {selected_row['錄取總分數(沒加權)'] - selected_weighted_total:.2f} 分。")
+        st.markdown('</div>', unsafe_allow_html=True)
+
+
 # 初始化 session state
 if 'show_scores' not in st.session_state:
     st.session_state.show_scores = False
@@ -241,12 +320,18 @@ if st.session_state.show_scores:
     
     # 尋找相近的學校及科系
     if not df_merged.empty:
+        # 一次矩陣運算算出使用者在所有校系的加權總分與加權平均（ScoringEngine 在資料載入時建立一次）
+        department_scores = get_multi_year_engine().score(
+            [chinese_score, english_score, math_score, special_one_score, special_two_score])
+        df_merged = df_merged.assign(加權總分=department_scores.totals,
+                                     加權平均=department_scores.weighted_averages)
+
         # 設定分數範圍（上下浮動 20 分）
         score_range = 5
-        similar_df = df_merged[
-            (df_merged["平均"] <= (total_score/5) + score_range) & 
-            (df_merged["平均"] >= (total_score/5) - score_range)
-        ].sort_values("平均")
+        # 以預先排序的「平均」索引做二分搜尋，結果依平均由低到高排列
+        similar_positions = get_score_index("113", "平均").between(
+            (total_score/5) - score_range, (total_score/5) + score_range)
+        similar_df = df_merged.iloc[similar_positions]
         
         if not similar_df.empty:
             st.markdown("### 🎯 分數相近的學校及科系")
@@ -258,58 +343,13 @@ if st.session_state.show_scores:
             # 顯示所有相近的學校和科系的表格
             st.markdown("#### 📋 所有分數相近的學校與科系")
             
-            # 準備表格數據
-            table_data = []
-            for index, row in similar_df.iterrows():
-                school_type = "公立" if row['學校名稱'].startswith("國立") else "私立"
-                # 計算加權總分
-                weighted_total = (chinese_score * row['國文加權'] +
-                                english_score * row[' 英文加權'] +
-                                math_score * row[' 數學加權'] +
-                                special_one_score * row[' 專業(一)加權'] +
-                                special_two_score * row[' 專業(二)加權'])
-                
-                # 計算加權總和
-                total_weight = (row['國文加權'] + row[' 英文加權'] + row[' 數學加權'] + 
-                              row[' 專業(一)加權'] + row[' 專業(二)加權'])
-                
-                # 計算加權平均
-                weighted_average = weighted_total / total_weight
-
-                # 計算分數差距
-                diff_113 = weighted_average - row['平均']
-                diff_112 = row['平均_112'] - (total_score/5) if pd.notna(row['平均_112']) else None
-                
-                # 計算分數差距的符號
-                diff_symbol_113 = "↑" if diff_113 > 0 else "↓" if diff_113 < 0 else "="
-                diff_symbol_112 = "↑" if diff_112 and diff_112 < 0 else "↓" if diff_112 and diff_112 > 0 else "=" if diff_112 is not None else "N/A"
-
-                # 格式化加權乘數
-                weight_multipliers = f"國文×{row['國文加權']} 英文×{row[' 英文加權']} 數學×{row[' 數學加權']} 專一×{row[' 專業(一)加權']} 專二×{row[' 專業(二)加權']}"
-
-                table_data.append({
-                    "學校類型": school_type,
-                    "學校名稱": row['學校名稱'],
-                    "科系名稱": row['系科組學程名稱'],
-                    "加權乘數": weight_multipliers,
-                    "113年平均": f"{row['平均']:.2f} ({diff_symbol_113} {abs(diff_113):.2f})",
-                    "加權平均": f"{weighted_average:.2f}",
-                    "112年平均": f"{row['平均_112']:.2f} ({diff_symbol_112} {abs(diff_112):.2f})" if pd.notna(row['平均_112']) else "N/A",
-                })
-            
-            # 顯示表格
-            table_df = pd.DataFrame(table_data)
+            # 準備表格數據（數值欄位，顯示時才格式化）
+            table_df = build_department_table(similar_df, total_score/5)
             # 根據113年平均分數排序
             table_df = table_df.sort_values(by="113年平均", ascending=False)
-            table_df = table_df.style.set_properties(**{
-                'text-align': 'center',
-                'font-size': '14px'
-            }).set_table_styles([
-                {'selector': 'th', 'props': [('background-color', '#4CAF50'), ('color', 'white')]},
-                {'selector': 'tr:nth-child(even)', 'props': [('background-color', '#f2f2f2')]}
-            ])
             
-            st.dataframe(table_df, use_container_width=True)
+            # 顯示表格
+            st.dataframe(style_department_table(table_df), width="stretch")
             
             # 找出分數最低的科目
             scores = {
@@ -324,241 +364,34 @@ if st.session_state.show_scores:
             st.markdown(f"#### 📊 分數分析")
             st.markdown(f"您的{lowest_subject[0]}分數最低，為 {lowest_subject[1]} 分")
 
-            # 找出該科目加權最低的校系
-            lowest_weight_schools = []
-            for index, row in similar_df.iterrows():
-                if lowest_subject[0] == '國文':
-                    weight = row['國文加權']
-                elif lowest_subject[0] == '英文':
-                    weight = row[' 英文加權']
-                elif lowest_subject[0] == '數學':
-                    weight = row[' 數學加權']
-                elif lowest_subject[0] == '專業(一)':
-                    weight = row[' 專業(一)加權']
-                else:  # 專業(二)
-                    weight = row[' 專業(二)加權']
-                
-                lowest_weight_schools.append({
-                    '學校名稱': row['學校名稱'],
-                    '科系名稱': row['系科組學程名稱'],
-                    '加權': weight
-                })
-
-            # 找出加權最低的校系
-            lowest_weight = min(lowest_weight_schools, key=lambda x: x['加權'])['加權']
-            lowest_weight_schools = [school for school in lowest_weight_schools if school['加權'] == lowest_weight]
+            # 找出相近校系中該科目加權最低的校系（以各科加權的排序索引查詢，列位置與 df_merged 相同）
+            suggested_positions, lowest_weight = subject_weight_index.lowest(lowest_subject[0], similar_positions)
             
             st.markdown(f"#### 🎯 建議校系")
             st.markdown(f"根據您的{lowest_subject[0]}分數最低，建議您考慮以下校系（{lowest_subject[0]}加權均為 {lowest_weight}）：")
             
             # 建立表格顯示所有建議校系
-            suggested_schools_data = []
-            for school in lowest_weight_schools:
-                # 找到對應的原始資料行
-                original_row = similar_df[
-                    (similar_df['學校名稱'] == school['學校名稱']) & 
-                    (similar_df['系科組學程名稱'] == school['科系名稱'])
-                ].iloc[0]
-                
-                # 計算加權總分
-                weighted_total = (chinese_score * original_row['國文加權'] +
-                                english_score * original_row[' 英文加權'] +
-                                math_score * original_row[' 數學加權'] +
-                                special_one_score * original_row[' 專業(一)加權'] +
-                                special_two_score * original_row[' 專業(二)加權'])
-                
-                # 計算加權總和
-                total_weight = (original_row['國文加權'] + original_row[' 英文加權'] + 
-                              original_row[' 數學加權'] + original_row[' 專業(一)加權'] + 
-                              original_row[' 專業(二)加權'])
-                
-                # 計算加權平均
-                weighted_average = weighted_total / total_weight
-
-                # 計算分數差距
-                diff_113 = weighted_average - original_row['平均']
-                diff_112 = original_row['平均_112'] - (total_score/5) if pd.notna(original_row['平均_112']) else None
-                
-                # 計算分數差距的符號
-                diff_symbol_113 = "↑" if diff_113 > 0 else "↓" if diff_113 < 0 else "="
-                diff_symbol_112 = "↑" if diff_112 and diff_112 < 0 else "↓" if diff_112 and diff_112 > 0 else "=" if diff_112 is not None else "N/A"
-
-                # 格式化加權乘數
-                weight_multipliers = f"國文×{original_row['國文加權']} 英文×{original_row[' 英文加權']} 數學×{original_row[' 數學加權']} 專一×{original_row[' 專業(一)加權']} 專二×{original_row[' 專業(二)加權']}"
-
-                suggested_schools_data.append({
-                    "學校類型": "公立" if original_row['學校名稱'].startswith("國立") else "私立",
-                    "學校名稱": school['學校名稱'],
-                    "科系名稱": school['科系名稱'],
-                    "加權乘數": weight_multipliers,
-                    "113年平均": f"{original_row['平均']:.2f} ({diff_symbol_113} {abs(diff_113):.2f})",
-                    "加權平均": f"{weighted_average:.2f}",
-                    "112年平均": f"{original_row['平均_112']:.2f} ({diff_symbol_112} {abs(diff_112):.2f})" if pd.notna(original_row['平均_112']) else "N/A"
-                })
-            
-            suggested_schools_df = pd.DataFrame(suggested_schools_data)
+            suggested_schools_df = build_department_table(df_merged.iloc[suggested_positions], total_score/5)
             # 根據113年平均分數排序
             suggested_schools_df = suggested_schools_df.sort_values(by="113年平均", ascending=False)
-            suggested_schools_df = suggested_schools_df.style.set_properties(**{
-                'text-align': 'center',
-                'font-size': '14px'
-            }).set_table_styles([
-                {'selector': 'th', 'props': [('background-color', '#4CAF50'), ('color', 'white')]},
-                {'selector': 'tr:nth-child(even)', 'props': [('background-color', '#f2f2f2')]}
-            ])
             
-            st.dataframe(suggested_schools_df, use_container_width=True)
+            st.dataframe(style_department_table(suggested_schools_df), width="stretch")
             
             # 顯示未被選中的校系
-            non_recommended_schools = similar_df[~similar_df.apply(
-                lambda row: (row['學校名稱'], row['系科組學程名稱']) in 
-                [(school['學校名稱'], school['科系名稱']) for school in lowest_weight_schools], 
-                axis=1
-            )]
+            non_recommended_schools = similar_df[~similar_df.index.isin(suggested_positions)]
             
             if not non_recommended_schools.empty:
                 st.markdown("#### ❌ 其他相近校系（不建議）")
                 st.markdown("以下校系雖然分數相近，但對您分數最低的科目加權較高：")
                 
-                non_recommended_data = []
-                for _, row in non_recommended_schools.iterrows():
-                    # 計算加權總分
-                    weighted_total = (chinese_score * row['國文加權'] +
-                                    english_score * row[' 英文加權'] +
-                                    math_score * row[' 數學加權'] +
-                                    special_one_score * row[' 專業(一)加權'] +
-                                    special_two_score * row[' 專業(二)加權'])
-                    
-                    # 計算加權總和
-                    total_weight = (row['國文加權'] + row[' 英文加權'] + row[' 數學加權'] + 
-                                  row[' 專業(一)加權'] + row[' 專業(二)加權'])
-                    
-                    # 計算加權平均
-                    weighted_average = weighted_total / total_weight
-
-                    # 計算分數差距
-                    diff_113 = weighted_average - row['平均']
-                    diff_112 = row['平均_112'] - (total_score/5) if pd.notna(row['平均_112']) else None
-                    
-                    # 計算分數差距的符號
-                    diff_symbol_113 = "↑" if diff_113 > 0 else "↓" if diff_113 < 0 else "="
-                    diff_symbol_112 = "↑" if diff_112 and diff_112 < 0 else "↓" if diff_112 and diff_112 > 0 else "=" if diff_112 is not None else "N/A"
-
-                    # 格式化加權乘數
-                    weight_multipliers = f"國文×{row['國文加權']} 英文×{row[' 英文加權']} 數學×{row[' 數學加權']} 專一×{row[' 專業(一)加權']} 專二×{row[' 專業(二)加權']}"
-
-                    non_recommended_data.append({
-                        "學校類型": "公立" if row['學校名稱'].startswith("國立") else "私立",
-                        "學校名稱": row['學校名稱'],
-                        "科系名稱": row['系科組學程名稱'],
-                        "加權乘數": weight_multipliers,
-                        "113年平均": f"{row['平均']:.2f} ({diff_symbol_113} {abs(diff_113):.2f})",
-                        "加權平均": f"{weighted_average:.2f}",
-                        "112年平均": f"{row['平均_112']:.2f} ({diff_symbol_112} {abs(diff_112):.2f})" if pd.notna(row['平均_112']) else "N/A"
-                    })
-                
-                non_recommended_df = pd.DataFrame(non_recommended_data)
+                non_recommended_df = build_department_table(non_recommended_schools, total_score/5)
                 # 根據113年平均分數排序
                 non_recommended_df = non_recommended_df.sort_values(by="113年平均", ascending=False)
-                non_recommended_df = non_recommended_df.style.set_properties(**{
-                    'text-align': 'center',
-                    'font-size': '14px',
-                    'color': '#666666'  # 使用較淡的顏色
-                }).set_table_styles([
-                    {'selector': 'th', 'props': [('background-color', '#666666'), ('color', 'white')]},
-                    {'selector': 'tr:nth-child(even)', 'props': [('background-color', '#f2f2f2')]}
-                ])
                 
-                st.dataframe(non_recommended_df, use_container_width=True)
-            
-            # 添加學校類型選擇
-            st.markdown("#### 🏫 依學校類型篩選")
-            school_type = st.radio("學校類型：", ["全部", "公立", "私立"], 
-                                 horizontal=True, 
-                                 key="school_type_radio",
-                                 index=["全部", "公立", "私立"].index(st.session_state.school_type))
-            
-            # 更新 session state
-            st.session_state.school_type = school_type
-            
-            # 根據學校類型篩選學校
-            if school_type == "公立":
-                filtered_schools = [school for school in similar_df["學校名稱"].unique() if school.startswith("國立")]
-                similar_df = similar_df[similar_df["學校名稱"].isin(filtered_schools)]
-            elif school_type == "私立":
-                filtered_schools = [school for school in similar_df["學校名稱"].unique() if not school.startswith("國立")]
-                similar_df = similar_df[similar_df["學校名稱"].isin(filtered_schools)]
-            
-            # 添加學校和科系選擇
-            st.markdown("#### 🎓 選擇特定學校與科系")
-            col1, col2 = st.columns(2)
-            with col1:
-                # 從表格中獲取學校列表
-                available_schools = similar_df["學校名稱"].unique()
-                similar_school = st.selectbox("選擇學校", 
-                                            available_schools, 
-                                            key="similar_school_select",
-                                            index=0 if st.session_state.similar_school is None else 
-                                                  list(available_schools).index(st.session_state.similar_school))
+                # 使用較淡的顏色
+                st.dataframe(style_department_table(non_recommended_df, style='muted'), width="stretch")
             
-            # 更新 session state
-            st.session_state.similar_school = similar_school
-            
-            with col2:
-                # 根據選中的學校篩選科系
-                filtered_dept = similar_df[similar_df["學校名稱"] == similar_school]
-                available_depts = filtered_dept["系科組學程名稱"].unique()
-                
-                # 如果之前選擇的科系不在當前學校的科系列表中，重置為第一個選項
-                if st.session_state.similar_dept not in available_depts:
-                    st.session_state.similar_dept = available_depts[0] if len(available_depts) > 0 else None
-                
-                similar_dept = st.selectbox("選擇科系", 
-                                          available_depts, 
-                                          key="similar_dept_select",
-                                          index=0 if st.session_state.similar_dept is None else 
-                                                list(available_depts).index(st.session_state.similar_dept))
-            
-            # 更新 session state
-            st.session_state.similar_dept = similar_dept
-            
-            # 顯示選中的學校和科系的詳細資訊
-            selected_row = similar_df[(similar_df["學校名稱"] == similar_school) & 
-                                    (similar_df["系科組學程名稱"] == similar_dept)].iloc[0]
-            
-            st.markdown("#### 📌 選中的學校與科系資訊")
-            with st.container():
-                st.markdown('<div class="card">', unsafe_allow_html=True)
-                st.write(f"**學校名稱**: {selected_row['學校名稱']}")
-                st.write(f"**科系名稱**: {selected_row['系科組學程名稱']}")
-                st.write(f"**平均分數**: {selected_row['平均']:.2f} 分")
-                st.write(f"**加權公式**: 國文 × {selected_row['國文加權']} + 英文 × {selected_row[' 英文加權']} + 數學 × {selected_row[' 數學加權']} + 專業(一) × {selected_row[' 專業(一)加權']} + 專業(二) × {selected_row[' 專業(二)加權']}")
-                st.markdown('</div>', unsafe_allow_html=True)
-            
-            # 計算使用該學校加權的成績
-            selected_chinese_weight = selected_row['國文加權']
-            selected_english_weight = selected_row[' 英文加權']
-            selected_math_weight = selected_row[' 數學加權']
-            selected_special_one_weight = selected_row[' 專業(一)加權']
-            selected_special_two_weight = selected_row[' 專業(二)加權']
-            
-            selected_weighted_total = (chinese_score * selected_chinese_weight +
-                                      english_score * selected_english_weight +
-                                      math_score * selected_math_weight +
-                                      special_one_score * selected_special_one_weight +
-                                      special_two_score * selected_special_two_weight)
-            
-            st.markdown("#### 📊 使用該學校加權的成績計算")
-            with st.container():
-                st.markdown('<div class="card">', unsafe_allow_html=True)
-                st.write(f"**加權總分**: {selected_weighted_total:.2f} 分")
-                st.write(f"**平均分數**: {selected_row['平均']:.2f} 分")
-                
-                if selected_weighted_total >= selected_row['錄取總分數(沒加權)']:
-                    st.success(f"✅ 您的加權總分 ({selected_weighted_total:.2f}) 達到或超過錄取總分 ({selected_row['錄取總分數(沒加權)']:.2f})！")
-                else:
-                    st.warning(f"❌ 您的加權總分 ({selected_weighted_total:.2f}) 低於錄取總分 ({selected_row['錄取總分數(沒加權)']:.2f})，差 {selected_row['錄取總分數(沒加權)'] - selected_weighted_total:.2f} 分。")
-                st.markdown('</div>', unsafe_allow_html=True)
+            school_detail_section(similar_df, df_merged, department_index)
         else:
             st.warning(f"沒有找到與您的平均分數 ({total_score/5:.2f}) 相近的學校及科系（上下浮動 {score_range} 分）")
             
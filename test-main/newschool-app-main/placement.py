@@ -0,0 +1,162 @@
+"""依招生名額分發科大甄選名單（延遲接受演算法）。
+
+analyze_cohort 替每位學生各自找最佳可錄取校系，不考慮同一校系名額有限；
+這裡把全班一起分發到校系，每個校系最多收「招生名額」位學生：
+
+- 學生的志願：所有可錄取的校系（加權平均 >= 校系平均），依校系平均由高到低排列，
+  平均相同時依 school_weights 的順序，第一志願即為 analyze_cohort 的最佳可錄取校系。
+- 校系的排序：學生在該校系的加權平均，較高者優先；相同時名單中較前面的學生優先。
+
+以學生提出申請的延遲接受演算法（deferred acceptance）求出穩定分發：每一輪所有未分發的學生
+同時向下一個志願申請，名額不足的校系留下排序較前面的學生、退回其餘的學生。
+不會有「學生與校系都寧願彼此配對」的情況，且每位學生得到所有穩定分發中對自己最好的結果。
+
+每位學生的志願以 (校系位置) 陣列串接保存（CSR 格式），只佔「學生 × 可錄取校系數」的空間；
+每一輪只重新排序收到申請的校系，數千位學生 × 數百個校系可在一秒內完成。
+"""
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from cohort import DEFAULT_CHUNK_SIZE, STUDENT_SCORE_COLUMNS, student_score_matrix
+from scoring import ScoringEngine
+
+# 未分發（沒有可錄取的校系，或可錄取的校系名額都已被排序較前面的學生佔滿）
+NOT_PLACED = '未分發'
+
+
+class Preferences(NamedTuple):
+    """每位學生的志願（CSR 格式）：學生 i 的志願為 departments[starts[i]:starts[i + 1]]。"""
+    starts: np.ndarray       # 長度為學生數 + 1
+    departments: np.ndarray  # 校系在 school_weights 中的列位置，依志願順序
+    averages: np.ndarray     # 學生在該校系的加權平均（校系排序學生的依據）
+
+
+class Placement(NamedTuple):
+    """分發結果，陣列長度皆為學生數。"""
+    department_index: np.ndarray   # 分發校系在 school_weights 中的列位置，-1 表示未分發
+    weighted_averages: np.ndarray  # 在分發校系的加權平均，未分發為 NaN
+    choice_rank: np.ndarray        # 分發校系是第幾志願（1 為最佳可錄取校系），未分發為 0
+    eligible_counts: np.ndarray    # 可錄取的校系數
+    rounds: int                    # 申請的輪數
+
+
+def department_capacities(school_weights):
+    """各校系的招生名額（缺值視為 0）。"""
+    capacities = pd.to_numeric(school_weights['招生名額'], errors='coerce').fillna(0)
+    return capacities.to_numpy(dtype=np.int64)
+
+
+def preference_lists(engine, student_scores, chunk_size=DEFAULT_CHUNK_SIZE):
+    """依 engine 的校系計算每位學生的志願（Preferences）。"""
+    student_scores = np.asarray(student_scores, dtype=float)
+    # 校系平均由高到低（穩定排序，平均相同時保留原順序；缺值排在最後且不會可錄取）
+    order = np.argsort(-engine.means, kind='stable')
+    means = engine.means[order]
+    weights = engine.weights[order]
+    weight_sums = np.where(engine.weight_sums[order] != 0, engine.weight_sums[order], np.nan)
+
+    counts, departments, averages = [], [], []
+    for start in range(0, len(student_scores), chunk_size):
+        chunk_averages = (student_scores[start:start + chunk_size] @ weights.T) / weight_sums
+        with np.errstate(invalid='ignore'):
+            admissible = chunk_averages >= means
+        # np.nonzero 依列、再依欄的順序回傳，正好是每位學生由高到低的志願
+        rows, cols = np.nonzero(admissible)
+        counts.append(admissible.sum(axis=1))
+        departments.append(order[cols])
+        averages.append(chunk_averages[rows, cols])
+
+    starts = np.zeros(len(student_scores) + 1, dtype=np.int64)
+    if counts:
+        np.cumsum(np.concatenate(counts), out=starts[1:])
+    return Preferences(
+        starts=starts,
+        departments=np.concatenate(departments) if departments else np.zeros(0, dtype=np.int64),
+        averages=np.concatenate(averages) if averages else np.zeros(0),
+    )
+
+
+def defer_acceptance(preferences, capacities):
+    """以學生提出申請的延遲接受演算法分發，回傳 Placement。"""
+    starts, ends = preferences.starts[:-1], preferences.starts[1:]
+    n = len(ends)
+    next_choice = starts.copy()   # 每位學生下一個要申請的志願在 departments 中的位置
+    held = np.full(n, -1, dtype=np.int64)
+    held_average = np.full(n, np.nan)
+    held_choice = np.full(n, -1, dtype=np.int64)
+
+    free = np.flatnonzero(ends > starts)
+    rounds = 0
+    while len(free):
+        rounds += 1
+        choice = next_choice[free]
+        next_choice[free] += 1
+        held[free] = preferences.departments[choice]
+        held_average[free] = preferences.averages[choice]
+        held_choice[free] = choice
+
+        # 只重新排序這一輪收到申請的校系：依校系、加權平均由高到低、名單順序
+        applicants = np.flatnonzero(np.isin(held, np.unique(held[free])))
+        applicants = applicants[np.lexsort((applicants, -held_average[applicants], held[applicants]))]
+        departments = held[applicants]
+        first = np.r_[True, departments[1:] != departments[:-1]]
+        positions = np.arange(len(applicants))
+        rank = positions - np.maximum.accumulate(np.where(first, positions, 0))
+
+        rejected = applicants[rank >= capacities[departments]]
+        held[rejected] = -1
+        held_average[rejected] = np.nan
+        held_choice[rejected] = -1
+        free = rejected[next_choice[rejected] < ends[rejected]]
+
+    placed = held >= 0
+    return Placement(
+        department_index=held,
+        weighted_averages=held_average,
+        choice_rank=np.where(placed, held_choice - starts + 1, 0),
+        eligible_counts=ends - starts,
+        rounds=rounds,
+    )
+
+
+def place_cohort(students, school_weights, chunk_size=DEFAULT_CHUNK_SIZE):
+    """依 school_weights 的招生名額分發學生名單，回傳分發結果表（沒有可錄取校系的學生不列出）。
+
+    school_weights 需有「招生名額」欄（見 cohort.build_school_weights）。
+    """
+    engine = ScoringEngine(school_weights)
+    preferences = preference_lists(engine, student_score_matrix(students), chunk_size)
+    placement = defer_acceptance(preferences, department_capacities(school_weights))
+    return placement_rows(students, placement, preferences, school_weights)
+
+
+def placement_rows(students, placement, preferences, school_weights):
+    """由 Placement 組出分發結果表（只含有可錄取校系的學生，依名單順序）。"""
+    eligible = placement.eligible_counts > 0
+    students = students[eligible]
+    department_index = placement.department_index[eligible]
+    placed = department_index >= 0
+    first_choice = school_weights.iloc[preferences.departments[preferences.starts[:-1][eligible]]]
+    placed_rows = school_weights.iloc[np.maximum(department_index, 0)]
+
+    def placed_column(col, default):
+        return pd.Series(placed_rows[col].to_numpy(), dtype=object).where(placed, default).to_numpy()
+
+    return pd.DataFrame({
+        '座號': students['座號'].to_numpy(),
+        '班級': students['班級'].to_numpy(),
+        **{col: students[col].to_numpy() for col in STUDENT_SCORE_COLUMNS},
+        '原本錄取學校': students['錄取學校'].to_numpy() if '錄取學校' in students.columns else '未錄取',
+        '原本錄取校系': students['錄取校系'].to_numpy() if '錄取校系' in students.columns else '未錄取',
+        '最佳可錄取學校': first_choice['學校名稱'].to_numpy(),
+        '最佳可錄取科系': first_choice['系科組學程名稱'].to_numpy(),
+        '分發學校': placed_column('學校名稱', NOT_PLACED),
+        '分發科系': placed_column('系科組學程名稱', NOT_PLACED),
+        '分發志願序': placement.choice_rank[eligible],
+        '可錄取校系數': placement.eligible_counts[eligible],
+        '加權平均': placement.weighted_averages[eligible],
+        '分發校系平均': np.where(placed, placed_rows['平均'].to_numpy(dtype=float), np.nan),
+        '招生名額': np.where(placed, placed_rows['招生名額'].to_numpy(), 0),
+    })
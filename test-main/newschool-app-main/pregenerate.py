@@ -0,0 +1,134 @@
+"""預先產生頁面會用到的 LLM 回覆。
+
+可能出現的 prompt 是固定的：112/113 年度每個（學校名稱, 系科組學程名稱）的校系資訊，
+以及性向測驗五個領域的建議。這個指令把它們事先產生好，寫成 llm_pregenerated.json.gz，
+app 啟動後直接查表，不必在使用者操作時呼叫 API。
+
+每完成一筆就寫入檢查點（JSONL），中斷後重新執行會從上次的進度接著做；
+失敗的 prompt 不會寫入檢查點，下次執行會重試。
+
+    python pregenerate.py --concurrency 4
+    python pregenerate.py --stub          # 使用離線的假模型測試整個流程
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import llm_client
+from datasets import ADMISSION_FILES, BASE_DIR, get_admission_table
+from llm_cache import cache_key
+from prompts import APTITUDE_FIELDS, admission_info_prompt, aptitude_prompt
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT = os.path.join(BASE_DIR, ".pregenerate_checkpoint.jsonl")
+
+
+def collect_prompts():
+    """所有需要預先產生的 prompt（去除重複、保留順序）。"""
+    prompts = []
+    for year in ADMISSION_FILES:
+        pairs = get_admission_table(year)[['學校名稱', '系科組學程名稱']].drop_duplicates()
+        prompts.extend(admission_info_prompt(school, dept) for school, dept in pairs.itertuples(index=False))
+    prompts.extend(aptitude_prompt(field) for field in APTITUDE_FIELDS)
+    return list(dict.fromkeys(prompts))
+
+
+def load_checkpoint(path):
+    """讀取檢查點，回傳 快取鍵 → 回覆。最後一行若因中斷而不完整就略過。"""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            done[entry["key"]] = entry["response"]
+    return done
+
+
+def _ensure_trailing_newline(path):
+    # 上次若在寫入途中中斷，先補上換行，避免新資料接在不完整的那一行後面
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+
+def write_artifact(path, responses, model, max_tokens):
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump({
+            "model": model,
+            "max_tokens": max_tokens,
+            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "responses": responses,
+        }, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def pregenerate(output, checkpoint, concurrency, model, max_tokens):
+    """產生所有尚未完成的回覆並寫出 output，回傳失敗的筆數。"""
+    prompts = {cache_key(prompt, model, max_tokens): prompt for prompt in collect_prompts()}
+    done = load_checkpoint(checkpoint)
+    todo = {key: prompt for key, prompt in prompts.items() if key not in done}
+    logger.info("共 %d 個 prompt，已完成 %d 個，待產生 %d 個", len(prompts), len(prompts) - len(todo), len(todo))
+
+    llm_client.set_max_concurrency(concurrency)
+    failed = 0
+    _ensure_trailing_newline(checkpoint)
+    with open(checkpoint, "a", encoding="utf-8") as f, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(llm_client.request_completion, prompt, model, max_tokens): key
+                   for key, prompt in todo.items()}
+        for count, future in enumerate(as_completed(futures), 1):
+            key = futures[future]
+            try:
+                done[key] = future.result()
+            except Exception as e:
+                failed += 1
+                logger.warning("產生失敗（下次執行會重試）：%s：%s", todo[key], e)
+                continue
+            f.write(json.dumps({"key": key, "prompt": todo[key], "response": done[key]}, ensure_ascii=False) + "\n")
+            f.flush()
+            if count % 50 == 0:
+                logger.info("進度 %d/%d", count, len(todo))
+
+    write_artifact(output, {key: done[key] for key in prompts if key in done}, model, max_tokens)
+    logger.info("已寫出 %s（%d 筆，失敗 %d 筆）", output, len(prompts) - failed, failed)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="預先產生校系資訊與性向領域的 LLM 回覆")
+    parser.add_argument("--output", default=llm_client.DEFAULT_PREGENERATED_PATH)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--concurrency", type=int, default=llm_client.DEFAULT_MAX_CONCURRENCY)
+    parser.add_argument("--model", default=llm_client.DEFAULT_MODEL)
+    parser.add_argument("--max-tokens", type=int, default=llm_client.DEFAULT_MAX_TOKENS)
+    parser.add_argument("--stub", action="store_true", help="使用離線的假模型（不呼叫 API）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.stub:
+        from llm_fake import FakeChatCompletion
+        llm_client.set_backend(FakeChatCompletion(latency=0.01, token_interval=0))
+    else:
+        from dotenv import load_dotenv
+        import openai
+        load_dotenv()
+        openai.api_key = os.getenv("OPENAI_API_KEY")
+
+    failed = pregenerate(args.output, args.checkpoint, args.concurrency, args.model, args.max_tokens)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
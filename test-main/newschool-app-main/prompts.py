@@ -0,0 +1,19 @@
+"""頁面送給 LLM 的 prompt。
+
+頁面與預先產生（pregenerate.py）共用同一組 prompt，兩邊算出的快取鍵才會一致。
+"""
+
+# 性向測驗的領域（與 Home.py 性向測驗分頁的計分項目一致）
+APTITUDE_FIELDS = ["理工", "人文", "藝術", "商管", "醫護"]
+
+
+def admission_info_prompt(school_name, department_name):
+    return f"使用者錄取了 {school_name} 的 {department_name}，請提供該學校與科系的相關資訊。"
+
+
+def shortfall_prompt(weighted_total, school_name, department_name, admission_score):
+    return f"使用者的加權總分為 {weighted_total:.2f}，未達到 {school_name} 的 {department_name} 錄取總分 {admission_score:.2f}，請提供建議或鼓勵的話。"
+
+
+def aptitude_prompt(field):
+    return f"使用者的性向測驗結果顯示最適合的領域是{field}，請提供關於這個領域的詳細建議，包括：1. 該領域的特點 2. 適合的人格特質 3. 未來發展方向 4. 學習建議"
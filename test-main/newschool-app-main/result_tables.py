@@ -0,0 +1,65 @@
+"""成績分析頁的校系結果表。
+
+結果表一律以數值欄位建立（可以正確、快速地依數值排序），
+箭頭、差距與小數位數只在顯示時透過 Styler 格式化。
+"""
+import numpy as np
+import pandas as pd
+
+from scoring import WEIGHT_COLUMNS
+
+# 加權乘數欄的顯示名稱，順序與 scoring.WEIGHT_COLUMNS 相同
+WEIGHT_LABELS = ['國文', '英文', '數學', '專一', '專二']
+
+TABLE_STYLES = {
+    'normal': {'color': None, 'header': '#4CAF50'},
+    'muted': {'color': '#666666', 'header': '#666666'},  # 不建議的校系使用較淡的顏色
+}
+
+
+def build_department_table(rows, user_average):
+    """由校系資料列建立相近校系結果表。
+
+    rows 需含「加權平均」（見 scoring.ScoringEngine）、「平均」、「平均_112」與「公立」（見 facets.py）欄位。
+    差距欄位的正值表示使用者高於該校系平均。
+    """
+    parts = [label + "×" + rows[col].astype(str) for label, col in zip(WEIGHT_LABELS, WEIGHT_COLUMNS)]
+    multipliers = parts[0].str.cat(parts[1:], sep=" ")
+
+    return pd.DataFrame({
+        "學校類型": np.where(rows['公立'].to_numpy(dtype=bool), "公立", "私立"),
+        "學校名稱": rows['學校名稱'],
+        "科系名稱": rows['系科組學程名稱'],
+        "加權乘數": multipliers,
+        "113年平均": rows['平均'].astype(float),
+        "113差距": (rows['加權平均'] - rows['平均']).astype(float),
+        "加權平均": rows['加權平均'].astype(float),
+        "112年平均": rows['平均_112'].astype(float),
+        "112差距": (user_average - rows['平均_112']).astype(float),
+    }).reset_index(drop=True)
+
+
+def format_gap(value):
+    """差距顯示為「↑ 1.23」的形式，缺值顯示 N/A。"""
+    if pd.isna(value):
+        return "N/A"
+    symbol = "↑" if value > 0 else "↓" if value < 0 else "="
+    return f"{symbol} {abs(value):.2f}"
+
+
+def style_department_table(table, style='normal'):
+    """在顯示時才套用小數位數、箭頭與表格樣式。"""
+    colors = TABLE_STYLES[style]
+    properties = {'text-align': 'center', 'font-size': '14px'}
+    if colors['color']:
+        properties['color'] = colors['color']
+    return table.style.format({
+        "113年平均": "{:.2f}",
+        "113差距": format_gap,
+        "加權平均": "{:.2f}",
+        "112年平均": "{:.2f}",
+        "112差距": format_gap,
+    }, na_rep="N/A").set_properties(**properties).set_table_styles([
+        {'selector': 'th', 'props': [('background-color', colors['header']), ('color', 'white')]},
+        {'selector': 'tr:nth-child(even)', 'props': [('background-color', '#f2f2f2')]}
+    ])
@@ -0,0 +1,112 @@
+"""加權成績計算。
+
+把各校系的五科加權存成 NumPy 矩陣（校系數 × 5），
+一次矩陣乘向量就能算出使用者在所有校系的加權總分、加權平均與各項差距；
+improvements() 同樣一次算出每個校系還差多少分、補哪一科最省力，可用來排出「最容易達到的校系」。
+"""
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+# 五科加權欄位（部分欄名前有空白，與 Excel 原始欄名一致）
+WEIGHT_COLUMNS = ['國文加權', ' 英文加權', ' 數學加權', ' 專業(一)加權', ' 專業(二)加權']
+
+# 科目名稱，順序與 WEIGHT_COLUMNS 相同
+SUBJECTS = ['國文', '英文', '數學', '專業(一)', '專業(二)']
+
+# 科目名稱 → 在 SUBJECTS / WEIGHT_COLUMNS / 加權矩陣中的欄位置
+SUBJECT_INDEX = {subject: i for i, subject in enumerate(SUBJECTS)}
+
+# 各科成績上限（補分時每科最多提高到這個分數）
+MAX_SCORE = 100
+
+
+class DepartmentScores(NamedTuple):
+    """使用者對每個校系的計算結果，每個欄位都是長度為校系數的陣列。"""
+    totals: np.ndarray             # 加權總分
+    weight_sums: np.ndarray        # 加權總和
+    weighted_averages: np.ndarray  # 加權平均（加權總和為 0 時為 NaN）
+    gap_to_mean: np.ndarray        # 加權平均 - 平均（正值表示高於該校系平均）
+    gap_to_admission: np.ndarray   # 錄取總分數 - 加權總分（正值表示還差的分數）
+
+
+class Improvements(NamedTuple):
+    """使用者達到每個校系錄取總分數的最少補分方式，每個欄位都是長度為校系數的陣列。"""
+    gap: np.ndarray             # 還差的加權分數（已達到為 0）
+    subject: np.ndarray         # 只補一科時最省力的科目在 SUBJECTS 中的位置（已達到或只補一科達不到為 -1）
+    subject_points: np.ndarray  # 該科需要提高的分數（差距 ÷ 該科加權；已達到為 0，只補一科達不到為 NaN）
+    points_needed: np.ndarray   # 可同時補多科時最少需要提高的總分數（已達到為 0，各科補到滿分仍不夠為 NaN）
+
+    def closest(self, k=None):
+        """尚未達到、但補分可以達到的校系列位置，依最少需要提高的總分數由少到多排序（最多 k 個）。"""
+        pending = np.flatnonzero((self.gap > 0) & ~np.isnan(self.points_needed))
+        order = pending[np.argsort(self.points_needed[pending], kind='stable')]
+        return order if k is None else order[:k]
+
+
+def _numeric_column(df, col):
+    if col not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+
+
+class ScoringEngine:
+    """以校系資料表建立的加權計算器，列的順序與傳入的 DataFrame 相同。"""
+
+    def __init__(self, df):
+        self.weights = df[WEIGHT_COLUMNS].to_numpy(dtype=float)
+        self.weight_sums = self.weights.sum(axis=1)
+        self.means = _numeric_column(df, '平均')
+        self.admission_scores = _numeric_column(df, '錄取總分數')
+
+    def __len__(self):
+        return len(self.weights)
+
+    def score(self, scores):
+        """scores 為五科成績（順序同 SUBJECTS），回傳 DepartmentScores。"""
+        totals = self.weights @ np.asarray(scores, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weighted_averages = np.where(self.weight_sums != 0, totals / self.weight_sums, np.nan)
+        return DepartmentScores(
+            totals=totals,
+            weight_sums=self.weight_sums,
+            weighted_averages=weighted_averages,
+            gap_to_mean=weighted_averages - self.means,
+            gap_to_admission=self.admission_scores - totals,
+        )
+
+    def improvements(self, scores, max_score=MAX_SCORE):
+        """scores 為五科成績（順序同 SUBJECTS），回傳每個校系的 Improvements。
+
+        只補一科時，差距 ÷ 該科加權最小（且不超過滿分）的科目最省力；可補多科時，
+        先補加權最高的科目（每提高 1 分增加最多加權分數），補到滿分再換下一科，所需的總分數最少。
+        """
+        scores = np.asarray(scores, dtype=float)
+        headroom = np.maximum(max_score - scores, 0)
+        gap = np.maximum(self.admission_scores - self.weights @ scores, 0)
+        done = gap == 0
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            per_subject = gap[:, None] / self.weights
+            candidates = np.where((self.weights > 0) & (per_subject <= headroom), per_subject, np.inf)
+        subject = candidates.argmin(axis=1)
+        subject_points = candidates[np.arange(len(self)), subject]
+        single = ~done & np.isfinite(subject_points)
+
+        # 各校系依加權由高到低補分
+        order = np.argsort(-self.weights, axis=1, kind='stable')
+        weights = np.take_along_axis(self.weights, order, axis=1)
+        room = headroom[order]
+        gains = weights * room
+        remaining = np.maximum(gap[:, None] - (np.cumsum(gains, axis=1) - gains), 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            used = np.where(weights > 0, np.minimum(remaining / weights, room), 0)
+        points_needed = np.where(gains.sum(axis=1) >= gap, used.sum(axis=1), np.nan)
+
+        return Improvements(
+            gap=gap,
+            subject=np.where(single, subject, -1),
+            subject_points=np.where(done, 0, np.where(single, subject_points, np.nan)),
+            points_needed=np.where(done, 0, points_needed),
+        )
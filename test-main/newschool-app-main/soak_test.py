@@ -0,0 +1,71 @@
+"""圖表記憶體的長時間測試（soak test）。
+
+關閉圖片快取後反覆繪製頁面上的所有圖表（每次輸入都不同），定期記錄常駐記憶體（RSS）
+與仍開啟的圖表數。暖機後記憶體成長超過上限或有圖表沒有關閉時以非 0 結束：
+
+    python soak_test.py --iterations 2000
+"""
+import argparse
+import gc
+import os
+import random
+import resource
+import sys
+
+import charts
+from datasets import get_multi_year_tables
+
+
+def rss_mb():
+    """目前的常駐記憶體（MB）；沒有 /proc 時改用歷史最高值。"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / 1024 / 1024 if sys.platform == "darwin" else maxrss / 1024
+
+
+def render_all(rng, compare_df):
+    """以隨機輸入繪製每一種圖表一次。"""
+    jitter = rng.uniform(-5, 5)
+    charts.admission_score_bars("學校", "科系", 300 + jitter, 320 - jitter)
+    charts.aptitude_radar({field: rng.uniform(1, 5) for field in ["理工", "人文", "藝術", "商管", "醫護"]})
+    charts.score_change_bars(compare_df['學校名稱'], compare_df['分數線變化'] + jitter)
+    charts.score_distribution(compare_df['112分數線'] + jitter, compare_df['113分數線'])
+    charts.choice_pie(rng.randint(0, 50), rng.randint(0, 50), rng.randint(1, 50), "學生選擇比較結果")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="反覆繪製圖表並檢查記憶體是否持續成長")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--report-every", type=int, default=200)
+    parser.add_argument("--max-growth-mb", type=float, default=20.0)
+    args = parser.parse_args()
+
+    # 每次都實際繪製，才能測到 matplotlib 的記憶體
+    charts.chart_cache.max_bytes = 0
+
+    compare_df = get_multi_year_tables().schools
+
+    rng = random.Random(0)
+    baseline = None
+    for i in range(1, args.iterations + 1):
+        render_all(rng, compare_df)
+        if i == args.warmup:
+            gc.collect()
+            baseline = rss_mb()
+        if i % args.report_every == 0:
+            gc.collect()
+            print(f"{i:>6} 次：RSS {rss_mb():.1f} MB，開啟中的圖表 {charts.live_figure_count()}")
+
+    gc.collect()
+    growth = 0.0 if baseline is None else rss_mb() - baseline
+    live = charts.live_figure_count()
+    print(f"暖機後記憶體成長 {growth:.1f} MB，開啟中的圖表 {live}")
+    sys.exit(1 if live or growth > args.max_growth_mb else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""不需呼叫 LLM 的備用說明文字。
+
+AI 回覆逾時或失敗時，頁面改顯示這裡由校系資料直接組出的摘要。
+"""
+import pandas as pd
+
+
+def _score(value):
+    return "無資料" if pd.isna(value) else f"{value:.2f} 分"
+
+
+def department_summary(row):
+    """由一筆校系資料（含 學校名稱、系科組學程名稱、錄取總分數、平均 等欄位）組出簡短摘要。"""
+    lines = [
+        f"**{row['學校名稱']} {row['系科組學程名稱']}**",
+        f"- 招生群(類)別：{row.get('招生群(類)別', '無資料')}",
+        f"- 招生名額：{row.get('招生名額', '無資料')}，錄取人數：{row.get('錄取人數', '無資料')}",
+        f"- 錄取總分數：{_score(row['錄取總分數'])}，錄取者平均：{_score(row['平均'])}",
+    ]
+    if '各科目加權' in row and pd.notna(row['各科目加權']):
+        lines.append(f"- 各科目加權：{row['各科目加權']}")
+    return "\n".join(lines)
+
+
+def field_summary(field, departments):
+    """性向測驗領域的摘要：列出該領域的建議科系。"""
+    return f"**{field}** 領域的建議科系：{'、'.join(departments)}。可先從這些科系的課程與出路開始了解。"
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# 測試直接匯入程式目錄下的模組（與 streamlit run 時相同）
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
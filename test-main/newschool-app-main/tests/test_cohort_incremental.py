@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cohort import STUDENT_SCORE_COLUMNS, analyze_cohort, build_school_weights, summarize_results
+from cohort_incremental import IncrementalCohort
+from datasets import COHORT_FILES, get_admission_table, get_cohort_table
+from indexes import DepartmentIndex
+from scoring import WEIGHT_COLUMNS
+
+
+def assert_matches_full(cohort, students, admissions):
+    school_weights = build_school_weights(admissions)
+    results, summary = cohort.update(students, school_weights, admissions)
+    full = analyze_cohort(students, school_weights, admissions, DepartmentIndex(admissions))
+    pd.testing.assert_frame_equal(results, full)
+    expected = summarize_results(full)
+    pd.testing.assert_series_equal(summary.school_counts.sort_index(), expected.school_counts.sort_index())
+    assert (summary.better, summary.same, summary.unknown) == (expected.better, expected.same, expected.unknown)
+
+
+@pytest.mark.parametrize("year", list(COHORT_FILES))
+def test_student_edits_and_removals(year):
+    admissions = get_admission_table(year)
+    students = get_cohort_table(year)
+    cohort = IncrementalCohort()
+    assert_matches_full(cohort, students, admissions)
+
+    assert_matches_full(cohort, students, admissions)
+    assert cohort.last_recomputed == 0
+
+    edited = students.copy()
+    edited.loc[edited.index[5], '英文分數'] = edited['英文分數'].iloc[5] + 30
+    assert_matches_full(cohort, edited, admissions)
+    assert cohort.last_recomputed == 1
+
+    duplicated = pd.concat([edited, edited.iloc[:3]], ignore_index=True)
+    assert_matches_full(cohort, duplicated, admissions)
+
+    removed = duplicated.drop(index=[0, 10, 20]).reset_index(drop=True)
+    assert_matches_full(cohort, removed, admissions)
+    assert cohort.last_recomputed == 0
+
+    assert_matches_full(cohort, removed.iloc[:0], admissions)
+    assert_matches_full(cohort, students, admissions)
+
+
+@pytest.mark.parametrize("year", list(COHORT_FILES))
+def test_department_edits_and_removals(year):
+    admissions = get_admission_table(year)
+    students = get_cohort_table(year)
+    cohort = IncrementalCohort()
+    assert_matches_full(cohort, students, admissions)
+
+    rng = np.random.default_rng(0)
+    for _ in range(6):
+        edited = admissions.copy()
+        row = edited.index[rng.integers(len(edited))]
+        col = rng.choice([WEIGHT_COLUMNS[0], '平均', '錄取總分數'])
+        edited.loc[row, col] = edited.loc[row, col] + rng.choice([-10, -1, 1, 10])
+        assert_matches_full(cohort, students, edited)
+        assert cohort.last_recomputed < len(students)
+
+    removed = admissions.drop(index=admissions.index[::7])
+    assert_matches_full(cohort, students, removed)
+    assert_matches_full(cohort, students, admissions)
+
+
+def test_unreachable_department_change_recomputes_nobody():
+    admissions = get_admission_table("113")
+    students = get_cohort_table("113").astype({col: float for col in STUDENT_SCORE_COLUMNS})
+    # 幾位成績缺值、沒有任何可錄取校系的學生
+    students.loc[students.index[:5], STUDENT_SCORE_COLUMNS] = np.nan
+    cohort = IncrementalCohort()
+    assert_matches_full(cohort, students, admissions)
+
+    # 平均高到沒有學生可錄取的校系，改加權不影響任何學生（包括沒有可錄取校系的學生）
+    edited = admissions.copy()
+    edited.loc[edited.index[0], '平均'] = 1000
+    assert_matches_full(cohort, students, edited)
+    edited.loc[edited.index[0], WEIGHT_COLUMNS[0]] = edited[WEIGHT_COLUMNS[0]].iloc[0] + 1
+    assert_matches_full(cohort, students, edited)
+    assert cohort.last_recomputed == 0
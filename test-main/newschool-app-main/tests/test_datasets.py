@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from datasets import COHORT_FILES, COHORT_NUMERIC_COLUMNS, _coerce_numeric, _source, iter_cohort_workbook
+
+
+def read_whole(path, sheet_name):
+    return _coerce_numeric(pd.read_excel(path, sheet_name=sheet_name), COHORT_NUMERIC_COLUMNS)
+
+
+def read_chunks(path, sheet_name, chunk_rows):
+    return pd.concat(list(iter_cohort_workbook(path, sheet_name, chunk_rows)), ignore_index=True).infer_objects()
+
+
+@pytest.mark.parametrize("year", list(COHORT_FILES))
+@pytest.mark.parametrize("chunk_rows", [7, 50, 10000])
+def test_chunks_match_read_excel(year, chunk_rows):
+    path, sheet_name = _source(COHORT_FILES, year)
+    pd.testing.assert_frame_equal(read_chunks(path, sheet_name, chunk_rows), read_whole(path, sheet_name))
+
+
+def test_chunks_match_read_excel_on_edge_cases(tmp_path):
+    path = tmp_path / "cohort.xlsx"
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "工作表1"
+    sheet.append(["座號", "班級", "錄取學校", *COHORT_NUMERIC_COLUMNS])
+    sheet.append(["03", "商經三一", "國立中興大學", 74, 81.5, "缺考", 76, 42])
+    sheet.append([None, None, None, None, None, None, None, None])
+    sheet.append(["10", "商經三一", None, 78, 87, 80, None, 64.0])
+    sheet.append([17, "商經三二", "朝陽科技大學", 50])
+    sheet.append([None, None, None, None, None, None, None, None])
+    workbook.save(path)
+
+    expected = read_whole(path, "工作表1")
+    for chunk_rows in (1, 2, 10):
+        pd.testing.assert_frame_equal(read_chunks(path, "工作表1", chunk_rows), expected)
+    chunks = list(iter_cohort_workbook(path, "工作表1", 2))
+    assert [len(chunk) for chunk in chunks] == [2, 2]
+    assert chunks[0]['座號'].isna().tolist() == [False, True]
@@ -0,0 +1,53 @@
+import pytest
+
+import llm_cache
+from llm_cache import LLMCache, cache_key
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_cache.time, "time", clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = LLMCache(path=str(tmp_path / "cache.sqlite3"), ttl_seconds=60)
+    cache.set("a", "回覆")
+    assert cache.get("a") == "回覆"
+
+    clock.now += 60
+    assert cache.get("a") is None
+    assert cache.get("a", allow_expired=True) == "回覆"
+
+    cache.purge_expired()
+    assert len(cache) == 0
+    assert cache.get("a", allow_expired=True) is None
+
+
+def test_least_recently_read_entry_is_evicted(tmp_path, clock):
+    cache = LLMCache(path=str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    assert cache.get("a") == "A"
+
+    cache.set("c", "C")
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+
+
+def test_cache_key_ignores_whitespace_but_not_model():
+    assert cache_key("你好  世界\n", "gpt-3.5-turbo", 500) == cache_key("你好 世界", "gpt-3.5-turbo", 500)
+    assert cache_key("你好", "gpt-3.5-turbo", 500) != cache_key("你好", "gpt-4", 500)
+    assert cache_key("你好", "gpt-3.5-turbo", 500) != cache_key("你好", "gpt-3.5-turbo", 100)
@@ -0,0 +1,149 @@
+import threading
+import time
+
+import pytest
+
+import llm_client
+from llm_cache import LLMCache
+from llm_fake import FakeChatCompletion
+
+
+class FailingChatCompletion(FakeChatCompletion):
+    def create(self, model, messages, max_tokens=None, stream=False, **kwargs):
+        super().create(model, messages, max_tokens, stream=False)
+        raise RuntimeError("上游錯誤")
+
+
+@pytest.fixture
+def use_backend(monkeypatch, tmp_path):
+    monkeypatch.setattr(llm_client, "_cache", LLMCache(path=str(tmp_path / "cache.sqlite3")))
+    monkeypatch.setattr(llm_client, "_pregenerated", {})
+    monkeypatch.setattr(llm_client, "_limiter", threading.BoundedSemaphore(2))
+
+    def use(backend):
+        monkeypatch.setattr(llm_client, "_backend", backend)
+        return backend
+    return use
+
+
+def wait_until_done(prompt, timeout=5):
+    deadline = time.monotonic() + timeout
+    while llm_client.pending(prompt):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_concurrent_sessions_share_one_upstream_call_per_prompt(use_backend):
+    backend = use_backend(FakeChatCompletion(latency=0.2, token_interval=0.001))
+    prompts = [f"使用者錄取了 學校{i} 的 科系" for i in range(3)]
+    sessions = 30
+    replies = [None] * sessions
+    barrier = threading.Barrier(sessions)
+
+    def session(i):
+        barrier.wait()
+        replies[i] = llm_client.chat_completion(prompts[i % len(prompts)])
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert dict(backend.calls) == {prompt: 1 for prompt in prompts}
+    assert backend.max_active <= 2
+    assert replies == [f"{prompts[i % len(prompts)]}：{backend.reply}" for i in range(sessions)]
+
+    # 完成後改由快取回覆
+    assert llm_client.chat_completion(prompts[0]) == replies[0]
+    assert llm_client.recent_timings[-1].cached
+    assert sum(backend.calls.values()) == len(prompts)
+
+
+def test_deadline_returns_fallback_and_finishes_in_background(use_backend):
+    backend = use_backend(FakeChatCompletion(latency=0.3, token_interval=0.001))
+    prompt = "逾時的 prompt"
+    shown = "".join(llm_client.stream_chat_completion(prompt, deadline=0.05, fallback="備用內容"))
+    assert shown == "備用內容"
+    assert llm_client.pending(prompt)
+
+    # 第二個 session 加入同一個請求，不會再呼叫上游
+    assert llm_client.chat_completion(prompt) == f"{prompt}：{backend.reply}"
+    wait_until_done(prompt)
+    assert llm_client.cached_response(prompt) == f"{prompt}：{backend.reply}"
+    assert backend.calls[prompt] == 1
+
+
+def test_failed_request_is_recorded_until_it_succeeds(use_backend):
+    use_backend(FailingChatCompletion(latency=0))
+    prompt = "會失敗的 prompt"
+    with pytest.raises(RuntimeError):
+        llm_client.chat_completion(prompt)
+    wait_until_done(prompt)
+    assert isinstance(llm_client.last_error(prompt), RuntimeError)
+    assert llm_client.cached_response(prompt) is None
+
+    backend = use_backend(FakeChatCompletion(latency=0, token_interval=0))
+    assert llm_client.chat_completion(prompt) == f"{prompt}：{backend.reply}"
+    assert llm_client.last_error(prompt) is None
+
+
+class RecordingChatCompletion(FakeChatCompletion):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.timeouts = []
+
+    def create(self, model, messages, max_tokens=None, stream=False, **kwargs):
+        self.timeouts.append(kwargs.get("request_timeout"))
+        return super().create(model, messages, max_tokens, stream, **kwargs)
+
+
+def test_stalled_stream_times_out_and_frees_its_slot(use_backend, monkeypatch):
+    # 每個字元間隔 0.2 秒，整個回覆遠超過 0.3 秒的上限
+    backend = use_backend(RecordingChatCompletion(latency=0, token_interval=0.2))
+    monkeypatch.setattr(llm_client, "_request_timeout", 0.3)
+    monkeypatch.setattr(llm_client, "_limiter", threading.BoundedSemaphore(1))
+    prompt = "上游卡住的 prompt"
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        llm_client.chat_completion(prompt)
+    assert time.monotonic() - started < 2
+    wait_until_done(prompt)
+    assert isinstance(llm_client.last_error(prompt), TimeoutError)
+    assert llm_client.cached_response(prompt) is None
+    assert backend.timeouts == [0.3]
+    assert backend.active == 0
+
+    # 名額已釋放，下一個請求可以正常完成
+    use_backend(FakeChatCompletion(latency=0, token_interval=0))
+    assert llm_client.chat_completion("下一個 prompt").startswith("下一個 prompt：")
+    assert llm_client.request_completion("直接請求").startswith("直接請求：")
+
+
+class EmptyChatCompletion(FakeChatCompletion):
+    """只回傳沒有文字的片段（例如被內容過濾）。"""
+
+    def create(self, model, messages, max_tokens=None, stream=False, **kwargs):
+        self.calls[messages[-1]["content"]] += 1
+        if not stream:
+            return {"choices": [{"message": {"role": "assistant", "content": ""}}]}
+        return iter([{"choices": [{"delta": {"role": "assistant"}}]}, {"choices": [{"delta": {}}]}])
+
+
+def test_empty_response_is_a_failure_and_not_cached(use_backend):
+    backend = use_backend(EmptyChatCompletion())
+    prompt = "沒有內容的 prompt"
+    shown = "".join(llm_client.stream_chat_completion(prompt, deadline=1, fallback="備用內容"))
+    assert shown == "備用內容"
+    wait_until_done(prompt)
+    assert isinstance(llm_client.last_error(prompt), ValueError)
+    assert llm_client.cached_response(prompt) is None
+    with pytest.raises(ValueError):
+        llm_client.request_completion(prompt)
+
+    # 快取中的空字串視為未命中，會重新向上游要回覆
+    llm_client.get_cache().set(llm_client.cache_key(prompt, llm_client.DEFAULT_MODEL, llm_client.DEFAULT_MAX_TOKENS), "")
+    backend = use_backend(FakeChatCompletion(latency=0, token_interval=0))
+    assert llm_client.chat_completion(prompt) == f"{prompt}：{backend.reply}"
+    assert backend.calls[prompt] == 1
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from placement import defer_acceptance, department_capacities, preference_lists
+from scoring import WEIGHT_COLUMNS, ScoringEngine
+
+
+def small_roster(seed, students=40, departments=8):
+    rng = np.random.default_rng(seed)
+    school_weights = pd.DataFrame(rng.choice([1, 1.5, 2, 3], size=(departments, 5)), columns=WEIGHT_COLUMNS)
+    school_weights['學校名稱'] = [f"學校{i}" for i in range(departments)]
+    school_weights['系科組學程名稱'] = "科系"
+    # 平均取整數，讓平均相同的校系與加權平均相同的學生都會出現
+    school_weights['平均'] = rng.integers(35, 75, departments).astype(float)
+    school_weights['錄取總分數'] = school_weights['平均'] * school_weights[WEIGHT_COLUMNS].sum(axis=1)
+    school_weights['招生名額'] = rng.integers(0, 5, departments)
+    scores = rng.integers(30, 100, size=(students, 5)).astype(float)
+    scores[::9] = scores[0]
+    return school_weights, scores
+
+
+def blocking_pairs(preferences, placement, capacities):
+    """學生 i 比起目前的結果更想去校系 d，且 d 有空位或會寧可收 i 的 (i, d)。"""
+    held = placement.department_index
+    pairs = []
+    for i in range(len(held)):
+        start, end = preferences.starts[i], preferences.starts[i + 1]
+        stop = start + placement.choice_rank[i] - 1 if held[i] >= 0 else end
+        for p in range(start, stop):
+            d = preferences.departments[p]
+            admitted = np.flatnonzero(held == d)
+            if len(admitted) < capacities[d]:
+                pairs.append((i, d))
+            elif any((preferences.averages[p], -i) > (placement.weighted_averages[j], -j) for j in admitted):
+                pairs.append((i, d))
+    return pairs
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_defer_acceptance_is_stable_within_capacities(seed):
+    school_weights, scores = small_roster(seed)
+    capacities = department_capacities(school_weights)
+    preferences = preference_lists(ScoringEngine(school_weights), scores)
+    placement = defer_acceptance(preferences, capacities)
+
+    held = placement.department_index
+    assert (np.bincount(held[held >= 0], minlength=len(capacities)) <= capacities).all()
+    assert blocking_pairs(preferences, placement, capacities) == []
+
+    placed = np.flatnonzero(held >= 0)
+    choices = preferences.starts[placed] + placement.choice_rank[placed] - 1
+    np.testing.assert_array_equal(preferences.departments[choices], held[placed])
+    np.testing.assert_array_equal(preferences.averages[choices], placement.weighted_averages[placed])
+
+
+def test_unlimited_capacity_gives_everyone_their_first_choice():
+    school_weights, scores = small_roster(0)
+    preferences = preference_lists(ScoringEngine(school_weights), scores)
+    placement = defer_acceptance(preferences, np.full(len(school_weights), len(scores)))
+    eligible = placement.eligible_counts > 0
+    assert (placement.choice_rank[eligible] == 1).all()
+    assert (placement.department_index[~eligible] == -1).all()
+    assert placement.rounds == 1
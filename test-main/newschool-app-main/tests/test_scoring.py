@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from datasets import ADMISSION_FILES, get_admission_table
+from scoring import WEIGHT_COLUMNS, ScoringEngine
+
+SCORES = [70, 65.5, 60, 72, 68]
+
+
+def per_row_scores(df, scores):
+    # 原本分數分析頁面逐列計算的公式
+    totals, averages, gaps = [], [], []
+    for _, row in df.iterrows():
+        weighted_total = sum(score * row[col] for score, col in zip(scores, WEIGHT_COLUMNS))
+        total_weight = sum(row[col] for col in WEIGHT_COLUMNS)
+        totals.append(weighted_total)
+        averages.append(weighted_total / total_weight)
+        gaps.append(weighted_total / total_weight - row['平均'])
+    return np.array(totals), np.array(averages), np.array(gaps)
+
+
+@pytest.mark.parametrize("year", list(ADMISSION_FILES))
+def test_engine_matches_per_row_formula(year):
+    df = get_admission_table(year)
+    df = df[df[WEIGHT_COLUMNS].sum(axis=1) != 0]
+    totals, averages, gaps = per_row_scores(df, SCORES)
+
+    result = ScoringEngine(df).score(SCORES)
+    np.testing.assert_allclose(result.totals, totals)
+    np.testing.assert_allclose(result.weighted_averages, averages)
+    np.testing.assert_allclose(result.gap_to_mean, gaps)
+    np.testing.assert_allclose(result.gap_to_admission, df['錄取總分數'].to_numpy(dtype=float) - totals)
+
+
+def test_zero_weight_sum_gives_nan_average():
+    df = get_admission_table("113").iloc[:3].copy()
+    df.loc[df.index[1], WEIGHT_COLUMNS] = 0
+    result = ScoringEngine(df).score(SCORES)
+    assert np.isnan(result.weighted_averages[1])
+    assert result.totals[1] == 0
+    assert not np.isnan(result.weighted_averages[[0, 2]]).any()